@@ -11,7 +11,8 @@ Date: 2024
 """
 
 import os
-from flask import Flask, request, jsonify, send_from_directory
+import json
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
@@ -42,6 +43,12 @@ logger = logging.getLogger(__name__)
 # Initialisation de l'application Flask
 app = Flask(__name__)
 
+# Répertoire public du frontend (images générées et fichiers statiques), résolu une seule fois
+PUBLIC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'frontend', 'public'
+)
+
 # Configuration sécurisée de l'application
 app.config['SECRET_KEY'] = SecurityConfig.get_secret_key()
 app.config['SQLALCHEMY_DATABASE_URI'] = SecurityConfig.get_database_url()
@@ -117,6 +124,19 @@ def api_status():
             'error': str(e)
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint des métriques du service Mistral.
+    
+    Returns:
+        dict: Statistiques du cache des réponses Mistral
+    """
+    return jsonify({
+        'timestamp': datetime.utcnow().isoformat(),
+        'mistral_cache': mistral_service.get_cache_stats()
+    })
+
 @app.route('/api/cocktails/generate', methods=['POST'])
 @rate_limit(limit=5, window=60)  # 5 requêtes par minute
 def generate_cocktail():
@@ -185,6 +205,82 @@ def generate_cocktail():
             'error': 'Erreur interne du serveur'
         }), 500
 
+@app.route('/api/cocktails/generate/stream', methods=['POST'])
+@rate_limit(limit=5, window=60)  # 5 requêtes par minute
+def generate_cocktail_stream():
+    """
+    Génère un nouveau cocktail en streaming (Server-Sent Events).
+    
+    Chaque champ de la fiche est envoyé dans un événement "field" dès que
+    Mistral l'a généré, puis le cocktail sauvegardé dans un événement
+    "cocktail" (ou un événement "error" en cas d'échec).
+    
+    Expected JSON payload:
+        {
+            "prompt": "Description de la demande utilisateur"
+        }
+    
+    Returns:
+        Response: Flux text/event-stream ou erreur JSON
+    """
+    data = request.get_json()
+    if not data or 'prompt' not in data:
+        log_security_event('INVALID_REQUEST', 'Champ prompt manquant')
+        return jsonify({
+            'error': 'Le champ "prompt" est requis'
+        }), 400
+    
+    # Validation et sanitisation sécurisée du prompt
+    try:
+        user_prompt = SecurityValidator.sanitize_prompt(data['prompt'])
+    except ValueError as e:
+        log_security_event('INVALID_INPUT', f'Prompt invalide: {str(e)}')
+        return jsonify({
+            'error': str(e)
+        }), 400
+    
+    logger.info(f"Génération en streaming d'un cocktail pour le prompt: {user_prompt[:100]}...")
+    
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    def events():
+        try:
+            for field, value in mistral_service.stream_cocktail(user_prompt):
+                if field != 'cocktail':
+                    yield sse('field', {'field': field, 'value': value})
+                    continue
+                
+                if not value:
+                    yield sse('error', {'error': 'Erreur lors de la génération du cocktail'})
+                    return
+                
+                # Sauvegarde en base de données
+                cocktail = Cocktail(
+                    name=value['name'],
+                    ingredients=value['ingredients'],
+                    description=value['description'],
+                    music_ambiance=value['music_ambiance'],
+                    image_prompt=value.get('image_prompt', ''),
+                    user_prompt=user_prompt
+                )
+                db.session.add(cocktail)
+                db.session.commit()
+                
+                logger.info(f"Cocktail '{cocktail.name}' sauvegardé avec l'ID {cocktail.id}")
+                yield sse('cocktail', {'success': True, 'cocktail': cocktail.to_dict()})
+        
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération du cocktail en streaming: {str(e)}")
+            db.session.rollback()
+            yield sse('error', {'error': 'Erreur interne du serveur'})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/cocktails', methods=['GET'])
 @rate_limit(limit=20, window=60)  # 20 requêtes par minute
 def get_cocktails():
@@ -302,20 +398,17 @@ def delete_cocktail(cocktail_id):
                     logger.warning(f"⚠️ Chemin d'image invalide détecté: {cocktail.image_path}")
                 else:
                     # Construire le chemin complet vers l'image
-                    # Le chemin stocké est relatif (ex: "/cocktail_name.png")
+                    # Le chemin stocké est relatif (ex: "/cocktail_name.webp")
                     # Le dossier public est dans frontend/public/
                     image_filename = cocktail.image_path.lstrip('/')
-                    image_full_path = os.path.join(
-                        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                        'frontend', 'public', image_filename
-                    )
+                    image_full_path = os.path.join(PUBLIC_DIR, image_filename)
                     
-                    # Vérifier que le fichier existe et le supprimer
-                    if os.path.exists(image_full_path):
+                    # Supprimer le fichier (un seul appel système, sans test d'existence préalable)
+                    try:
                         os.remove(image_full_path)
                         image_deleted = True
                         logger.info(f"🗑️ Image supprimée: {image_full_path}")
-                    else:
+                    except FileNotFoundError:
                         logger.warning(f"⚠️ Image non trouvée: {image_full_path}")
                     
             except Exception as img_error:
@@ -461,9 +554,7 @@ def serve_static_files(filename):
                 'error': 'Type de fichier non autorisé'
             }), 403
         
-        # Chemin vers le répertoire public du frontend
-        static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'public')
-        return send_from_directory(static_dir, filename)
+        return send_from_directory(PUBLIC_DIR, filename)
     except FileNotFoundError:
         return jsonify({
             'error': f'Fichier {filename} non trouvé'
@@ -5,11 +5,14 @@ Package des services pour Le Mixologue Augmenté
 
 Contient les services métier de l'application :
 - MistralService : Intégration avec l'API Mistral pour la génération de cocktails
+- LLMCache : Cache en mémoire des réponses Mistral (correspondance exacte)
+- SemanticCache : Cache des réponses Mistral pour les demandes proches
 
 Auteur: Assistant IA
 Date: 2024
 """
 
 from .mistral_service import MistralService
+from .llm_cache import LLMCache, SemanticCache
 
-__all__ = ['MistralService']
\ No newline at end of file
+__all__ = ['MistralService', 'LLMCache', 'SemanticCache']
\ No newline at end of file
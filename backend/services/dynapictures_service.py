@@ -6,135 +6,756 @@ Version simplifiée utilisant les prompts générés par Mistral
 """
 
 import os
+
+# Segments extensibles pour l'allocateur CUDA : évite la fragmentation (et les
+# OOM intermittents) entre générations de tailles de batch différentes. Doit être
+# défini avant l'import de torch ; une valeur déjà présente dans l'environnement prime
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True')
+
 import torch
 import logging
-from datetime import datetime
-from typing import Optional
+import functools
+import threading
+import time
+import shutil
+import hashlib
+import secrets
+import numpy as np
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from diffusers import DiffusionPipeline, DDIMScheduler
 import PIL.Image
 
 logger = logging.getLogger(__name__)
 
+# Résolution fixe : cuDNN peut sélectionner une fois pour toutes les noyaux les plus rapides
+torch.backends.cudnn.benchmark = True
+
+# Prompt négatif commun à toutes les générations
+NEGATIVE_PROMPT = "blurry, low quality, distorted, ugly, bad anatomy, text, watermark"
+
+# Marge de VRAM (en Go) réservée aux activations en plus des poids du pipeline
+VRAM_HEADROOM_GB = 1.5
+
+def _env_flag(name: str) -> bool:
+    """
+    Lit une option booléenne de l'environnement.
+    
+    Args:
+        name (str): Nom de la variable d'environnement
+    
+    Returns:
+        bool: True si la variable vaut "1" ou "true" (casse ignorée)
+    """
+    return os.getenv(name, 'false').strip().lower() in ('1', 'true')
+
 class DynaPicturesService:
     """
     Service simplifié de génération d'images avec Stable Diffusion.
     Utilise les prompts fournis par Mistral pour générer des images de cocktails.
     """
     
-    def __init__(self):
+    def __init__(self, disable_safety_checker: Optional[bool] = None):
         """
-        Initialise le service avec le pipeline Stable Diffusion.
+        Initialise le service. Le pipeline Stable Diffusion est chargé
+        à la première génération d'image.
+        
+        Args:
+            disable_safety_checker (Optional[bool]): Ne pas charger le filtre de contenu
+                (passe CLIP supplémentaire par image), pour les tests et benchmarks.
+                Par défaut, lu dans DYNA_PICTURES_DISABLE_SAFETY_CHECKER
         """
         self.pipeline = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        if disable_safety_checker is None:
+            disable_safety_checker = _env_flag('DYNA_PICTURES_DISABLE_SAFETY_CHECKER')
+        self.disable_safety_checker = disable_safety_checker
+        self._pipeline_lock = threading.Lock()
+        self._pipeline_load_failed = False
+        # Le pipeline est partagé entre threads (pool du service Mistral, workers
+        # gthread) : DeepCache garde son compteur d'étapes et ses caractéristiques
+        # en cache sur l'UNet, et le rejeu des graphes CUDA (torch.compile,
+        # stable-fast) n'est pas sûr entre threads. Les appels au pipeline sont donc
+        # sérialisés, le GPU les exécutant de toute façon l'un après l'autre
+        self._generation_lock = threading.Lock()
+        self.device = self._select_device()
+        self.model_id = os.getenv('DYNA_PICTURES_MODEL', 'runwayml/stable-diffusion-v1-5')
+        # 25 étapes DDIM par défaut ; une valeur basse (8-12) suffit pour les tests
+        # fonctionnels, la durée de génération étant proportionnelle au nombre d'étapes
+        self.num_inference_steps = int(os.getenv('DYNA_PICTURES_STEPS', '25'))
         self.output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'frontend', 'public')
         
         os.makedirs(self.output_dir, exist_ok=True)
-        self._load_pipeline()
+        
+        # Cache disque optionnel des images par prompt (désactivé si non configuré) :
+        # un prompt déjà rendu est servi sans débruitage
+        self.cache_dir = os.getenv('DYNA_PICTURES_CACHE_DIR')
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        
+        # Cache des embeddings CLIP par texte : le prompt négatif étant constant,
+        # son encodage n'est calculé qu'une seule fois
+        self._encode_prompt = functools.lru_cache(maxsize=64)(self._compute_prompt_embeds)
+
+    @staticmethod
+    def _select_device() -> str:
+        """
+        Choisit le device de génération : CUDA, puis Apple Silicon (MPS), puis CPU.
+        
+        Returns:
+            str: Nom du device PyTorch
+        """
+        if torch.cuda.is_available():
+            return "cuda"
+        mps_backend = getattr(torch.backends, 'mps', None)
+        if mps_backend is not None and mps_backend.is_available():
+            return "mps"
+        return "cpu"
+
+    def _ensure_pipeline(self) -> bool:
+        """
+        Charge le pipeline au premier appel (une seule fois, même en concurrence).
+        
+        Returns:
+            bool: True si le pipeline est prêt, False sinon
+        """
+        if self.pipeline is None and not self._pipeline_load_failed:
+            with self._pipeline_lock:
+                if self.pipeline is None and not self._pipeline_load_failed:
+                    # Le pipeline n'est publié qu'une fois entièrement configuré :
+                    # la lecture hors verrou ne voit jamais un pipeline partiel
+                    pipeline = self._load_pipeline()
+                    self._pipeline_load_failed = pipeline is None
+                    self.pipeline = pipeline
+        return self.pipeline is not None
 
     def _load_pipeline(self):
         """
-        Charge le pipeline Stable Diffusion.
+        Charge et configure le pipeline Stable Diffusion.
+        
+        Returns:
+            DiffusionPipeline: Pipeline prêt à l'emploi, None en cas d'échec
         """
         try:
-            model_id = os.getenv('DYNA_PICTURES_MODEL', 'runwayml/stable-diffusion-v1-5')
-            logger.info(f"🚀 Chargement du modèle: {model_id} sur {self.device}")
+            model_id = self.model_id
+            logger.info("🚀 Chargement du modèle: %s sur %s", model_id, self.device)
             
-            self.pipeline = DiffusionPipeline.from_pretrained(
+            load_kwargs = {}
+            if self.disable_safety_checker:
+                # Le filtre n'est pas chargé du tout : ni poids en mémoire, ni passe CLIP
+                load_kwargs.update(safety_checker=None, requires_safety_checker=False)
+            
+            # Encodeurs de texte int8 (optionnels) chargés avant le pipeline et
+            # transmis à from_pretrained : leurs versions FP16 ne sont jamais chargées
+            if _env_flag('DYNA_PICTURES_TEXT_ENCODER_8BIT'):
+                load_kwargs.update(self._load_quantized_text_encoders(model_id))
+            quantized_text_encoders = 'text_encoder' in load_kwargs or 'text_encoder_2' in load_kwargs
+            
+            pipeline = DiffusionPipeline.from_pretrained(
                 model_id,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
-            ).to(self.device)
+                # FP16 sur GPU (CUDA ou Apple Silicon) : moitié moins de mémoire et de bande passante
+                torch_dtype=torch.float16 if self.device in ("cuda", "mps") else torch.float32,
+                low_cpu_mem_usage=True,  # Poids chargés directement, sans copie initialisée
+                **load_kwargs
+            )
             
             # Remplacer le scheduler par défaut par DDIMScheduler pour éviter les erreurs
             # Le scheduler PNDM et DPMSolver causent des erreurs d'index
             try:
-                self.pipeline.scheduler = DDIMScheduler.from_config(
-                    self.pipeline.scheduler.config
+                pipeline.scheduler = DDIMScheduler.from_config(
+                    pipeline.scheduler.config
                 )
                 logger.info("✅ Scheduler remplacé par DDIMScheduler")
             except Exception as scheduler_e:
-                logger.warning(f"⚠️ Impossible de changer le scheduler: {scheduler_e}")
+                logger.warning("⚠️ Impossible de changer le scheduler: %s", scheduler_e)
+            
+            # Compilation stable-fast de l'UNet (optionnelle, CUDA uniquement)
+            use_stable_fast = (
+                self.device == "cuda"
+                and _env_flag('DYNA_PICTURES_STABLE_FAST')
+            )
+            
+            # Compilation torch.compile de l'UNet (optionnelle, CUDA uniquement,
+            # redondante avec stable-fast qui est prioritaire)
+            use_torch_compile = (
+                self.device == "cuda"
+                and not use_stable_fast
+                and _env_flag('DYNA_PICTURES_TORCH_COMPILE')
+            )
             
-            # Optimisations mémoire (seulement si disponibles)
+            # Le déchargement CPU n'est activé que si le pipeline ne tient pas en VRAM.
+            # Les poids int8 de bitsandbytes ne peuvent pas être déplacés vers le CPU
+            # et les graphes CUDA (stable-fast, torch.compile) exigent des poids fixes
+            # en mémoire : le pipeline reste alors résident sur le GPU.
+            fits_in_vram = self.device != "cuda" or self._fits_in_vram(pipeline)
+            use_cpu_offload = (
+                not fits_in_vram
+                and not quantized_text_encoders
+                and not use_stable_fast
+                and not use_torch_compile
+                and hasattr(pipeline, 'enable_model_cpu_offload')
+            )
+            if not fits_in_vram and not use_cpu_offload:
+                logger.warning("⚠️ VRAM insuffisante mais déchargement CPU incompatible, pipeline laissé sur le GPU")
+            if not use_cpu_offload:
+                pipeline.to(self.device)
+            
+            # Optimisations mémoire (seulement si disponibles). Sur GPU, l'attention
+            # fusionnée évite de matérialiser la matrice d'attention : le découpage
+            # (attention slicing), qui la désactiverait, n'est gardé que sur CPU
             try:
-                if hasattr(self.pipeline, 'enable_attention_slicing'):
-                    self.pipeline.enable_attention_slicing()
-                if self.device == "cuda" and hasattr(self.pipeline, 'enable_model_cpu_offload'):
-                    self.pipeline.enable_model_cpu_offload()
+                fused = self.device == "cuda" and self._enable_efficient_attention(pipeline)
+                if not fused and hasattr(pipeline, 'enable_attention_slicing'):
+                    pipeline.enable_attention_slicing()
+                # Décodage VAE image par image (batchs) et par tuiles (grandes
+                # résolutions) : le pic mémoire du décodage ne croît plus avec la taille
+                vae = getattr(pipeline, 'vae', None)
+                if hasattr(vae, 'enable_slicing'):
+                    vae.enable_slicing()
+                if hasattr(vae, 'enable_tiling'):
+                    vae.enable_tiling()
+                if use_cpu_offload:
+                    pipeline.enable_model_cpu_offload()
+                    logger.info("💾 VRAM insuffisante, déchargement CPU du modèle activé")
             except Exception as opt_e:
-                logger.warning(f"⚠️ Optimisations mémoire non disponibles: {opt_e}")
+                logger.warning("⚠️ Optimisations mémoire non disponibles: %s", opt_e)
+            
+            # Format NHWC pour l'UNet et le VAE : cuDNN utilise directement les Tensor Cores
+            if self.device == "cuda":
+                try:
+                    for attr in ('unet', 'vae'):
+                        module = getattr(pipeline, attr, None)
+                        if module is not None:
+                            module.to(memory_format=torch.channels_last)
+                    logger.info("✅ UNet et VAE convertis en channels_last")
+                except Exception as format_e:
+                    logger.warning("⚠️ Conversion channels_last impossible: %s", format_e)
+            
+            if use_stable_fast:
+                pipeline = self._compile_with_stable_fast(pipeline)
+            elif use_torch_compile:
+                self._compile_unet(pipeline)
+            elif _env_flag('DYNA_PICTURES_DEEPCACHE'):
+                # DeepCache remplace le forward de l'UNet : incompatible avec les compilations
+                self._enable_deepcache(pipeline)
             
             logger.info("✅ Pipeline chargé avec succès")
+            return pipeline
             
         except Exception as e:
-            logger.error(f"❌ Erreur chargement pipeline: {e}")
-            self.pipeline = None
+            logger.error("❌ Erreur chargement pipeline: %s", e)
+            return None
 
-    def generate_image(self, prompt: str) -> Optional[str]:
+    def _enable_efficient_attention(self, pipeline) -> bool:
         """
-        Génère une image à partir du prompt fourni par Mistral.
+        Active l'attention mémoire-efficace de l'UNet : xformers si installé,
+        sinon scaled_dot_product_attention de PyTorch 2.
         
         Args:
-            prompt (str): Le prompt d'image généré par Mistral
+            pipeline (DiffusionPipeline): Pipeline en cours de configuration
         
         Returns:
-            Optional[str]: Le chemin relatif de l'image générée ou None en cas d'échec
+            bool: True si une attention fusionnée est active
         """
-        if not self.pipeline:
-            logger.error("❌ Pipeline non initialisé")
-            return None
+        try:
+            pipeline.enable_xformers_memory_efficient_attention()
+            logger.info("✅ Attention xformers activée")
+            return True
+        except Exception as xformers_e:
+            logger.info("xformers non disponible (%s), utilisation de SDPA", xformers_e)
+        
+        try:
+            from diffusers.models.attention_processor import AttnProcessor2_0
+            pipeline.unet.set_attn_processor(AttnProcessor2_0())
+            logger.info("✅ Attention SDPA activée")
+            return True
+        except Exception as sdpa_e:
+            logger.warning("⚠️ Attention SDPA non disponible: %s", sdpa_e)
+            return False
 
+    def _get_available_vram(self) -> float:
+        """
+        Retourne la VRAM libre selon le driver, tous processus confondus.
+        
+        Returns:
+            float: VRAM utilisable en Go (marge de 10 %), 0 sans CUDA
+        """
+        if self.device != "cuda":
+            return 0.0
+        free, _total = torch.cuda.mem_get_info(0)
+        return (free / 1024**3) * 0.9
+
+    def _fits_in_vram(self, pipeline) -> bool:
+        """
+        Vérifie si les poids du pipeline et une marge d'activations tiennent en VRAM.
+        
+        Args:
+            pipeline (DiffusionPipeline): Pipeline en cours de configuration
+        
+        Returns:
+            bool: True si le pipeline peut rester entièrement résident sur le GPU
+        """
         try:
-            # Tronquer le prompt si nécessaire pour éviter les erreurs CLIP (max 77 tokens)
-            # Le tokenizer de CLIP est interne au pipeline, nous allons donc tronquer le texte brut
-            # Une estimation simple est de limiter à environ 500 caractères pour 77 tokens
-            # C'est une solution temporaire, une meilleure approche serait d'utiliser le tokenizer réel
-            max_prompt_length = 500 # Approximation pour 77 tokens
-            
-            logger.info(f"Prompt original: {prompt}")
-            processed_prompt = prompt[:max_prompt_length] if len(prompt) > max_prompt_length else prompt
+            # Les poids déjà sur le GPU (encodeurs int8) sont exclus de la VRAM libre
+            weights_bytes = sum(
+                param.numel() * param.element_size()
+                for component in pipeline.components.values()
+                if isinstance(component, torch.nn.Module)
+                for param in component.parameters()
+                if param.device.type != "cuda"
+            )
+            required_gb = weights_bytes / 1024**3 + VRAM_HEADROOM_GB
+            available_gb = self._get_available_vram()
+            logger.info("📊 VRAM requise: %.1f Go, disponible: %.1f Go", required_gb, available_gb)
+            return available_gb >= required_gb
+        except Exception as vram_e:
+            logger.warning("⚠️ Estimation de la VRAM impossible: %s", vram_e)
+            return False
 
-            logger.info(f"🎨 Génération avec prompt Mistral (tronqué): {processed_prompt[:100]}...")
-            
+    def _load_quantized_text_encoders(self, model_id: str) -> dict:
+        """
+        Charge les encodeurs de texte CLIP du modèle en int8 via bitsandbytes.
+        
+        L'UNet et le VAE restent en FP16 ; seuls les encodeurs de texte
+        (text_encoder et text_encoder_2 pour SDXL) sont quantifiés.
+        
+        Args:
+            model_id (str): Identifiant du modèle à charger
+        
+        Returns:
+            dict: Encodeurs quantifiés par nom de composant, à transmettre à
+                from_pretrained (vide si la quantification est impossible)
+        """
+        if self.device != "cuda":
+            logger.warning("⚠️ Quantification int8 ignorée: CUDA requis")
+            return {}
+        
+        try:
+            import transformers
+            bnb_config = transformers.BitsAndBytesConfig(load_in_8bit=True)
+            model_index = DiffusionPipeline.load_config(model_id)
+        except Exception as setup_e:
+            logger.warning("⚠️ Quantification int8 impossible: %s", setup_e)
+            return {}
+        
+        encoders = {}
+        for attr in ('text_encoder', 'text_encoder_2'):
+            # model_index.json associe chaque composant à sa classe : ["transformers", "CLIPTextModel"]
+            library, class_name = model_index.get(attr) or (None, None)
+            if library != 'transformers':
+                continue
             try:
-                # Exécuter le pipeline de génération d'image
-                # Ajout de num_inference_steps pour un contrôle plus fin, valeur par défaut 50
-                # Ajout de guidance_scale pour contrôler la force du prompt, valeur par défaut 7.5
+                encoders[attr] = getattr(transformers, class_name).from_pretrained(
+                    model_id,
+                    subfolder=attr,
+                    quantization_config=bnb_config,
+                    torch_dtype=torch.float16
+                )
+                logger.info("✅ %s quantifié en int8", attr)
+            except Exception as quant_e:
+                logger.warning("⚠️ Impossible de quantifier %s: %s", attr, quant_e)
+        return encoders
+
+    def _compile_with_stable_fast(self, pipeline):
+        """
+        Compile le pipeline avec stable-fast (fusion des noyaux et graphes CUDA).
+        
+        Args:
+            pipeline (DiffusionPipeline): Pipeline en cours de configuration
+        
+        Returns:
+            DiffusionPipeline: Pipeline compilé, ou pipeline d'origine en cas d'échec
+        """
+        try:
+            from sfast.compilers.diffusion_pipeline_compiler import compile, CompilationConfig
+        except ImportError as import_e:
+            logger.warning("⚠️ stable-fast non disponible: %s", import_e)
+            return pipeline
+        
+        config = CompilationConfig.Default()
+        try:
+            import xformers  # noqa: F401
+            config.enable_xformers = True
+        except ImportError:
+            logger.info("xformers non disponible, attention SDPA conservée")
+        try:
+            import triton  # noqa: F401
+            config.enable_triton = True
+        except ImportError:
+            logger.info("triton non disponible, fusion Triton désactivée")
+        config.enable_cuda_graph = True
+        
+        try:
+            compiled = compile(pipeline, config)
+            logger.info("✅ Pipeline compilé avec stable-fast")
+            return compiled
+        except Exception as compile_e:
+            logger.warning("⚠️ Compilation stable-fast impossible: %s", compile_e)
+            return pipeline
+
+    def _compile_unet(self, pipeline) -> bool:
+        """
+        Compile l'UNet avec torch.compile (mode reduce-overhead, graphes CUDA)
+        puis effectue une génération de préchauffage.
+        
+        La compilation a lieu au premier appel : le préchauffage la déclenche au
+        chargement plutôt que pendant la première requête d'un utilisateur.
+        
+        Args:
+            pipeline (DiffusionPipeline): Pipeline en cours de configuration
+        
+        Returns:
+            bool: True si la compilation et le préchauffage ont réussi
+        """
+        original_unet = pipeline.unet
+        try:
+            pipeline.unet = torch.compile(original_unet, mode="reduce-overhead", fullgraph=False)
+            with torch.inference_mode():
+                pipeline(
+                    prompt="cocktail",
+                    num_inference_steps=2,
+                    height=512,
+                    width=512,
+                    output_type="pt"
+                )
+            logger.info("✅ UNet compilé avec torch.compile")
+            return True
+        except Exception as compile_e:
+            logger.warning("⚠️ Compilation torch.compile impossible: %s", compile_e)
+            pipeline.unet = original_unet
+            return False
+
+    def _enable_deepcache(self, pipeline) -> bool:
+        """
+        Active DeepCache : les caractéristiques des blocs profonds de l'UNet,
+        très proches d'une étape à l'autre, sont réutilisées entre deux étapes
+        complètes au lieu d'être recalculées.
+        
+        Args:
+            pipeline (DiffusionPipeline): Pipeline en cours de configuration
+        
+        Returns:
+            bool: True si DeepCache est actif
+        """
+        try:
+            from DeepCache import DeepCacheSDHelper
+        except ImportError as import_e:
+            logger.warning("⚠️ DeepCache non disponible: %s", import_e)
+            return False
+        
+        try:
+            helper = DeepCacheSDHelper(pipe=pipeline)
+            helper.set_params(cache_interval=3, cache_branch_id=0)
+            helper.enable()
+            logger.info("✅ DeepCache activé (calcul complet toutes les 3 étapes)")
+            return True
+        except Exception as cache_e:
+            logger.warning("⚠️ Activation de DeepCache impossible: %s", cache_e)
+            return False
+
+    def _compute_prompt_embeds(self, text: str) -> tuple:
+        """
+        Encode un texte avec les encodeurs CLIP du pipeline.
+        
+        Args:
+            text (str): Texte à encoder (prompt positif ou négatif)
+        
+        Returns:
+            tuple: (embeddings, embeddings "pooled" ou None hors SDXL), détachés
+        """
+        with self._generation_lock, torch.inference_mode():
+            embeds = self.pipeline.encode_prompt(
+                prompt=text,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False
+            )
+        
+        # SD 1.x/2.x renvoient (embeds, None), SDXL (embeds, None, pooled, None)
+        prompt_embeds = embeds[0].detach()
+        pooled_embeds = embeds[2].detach() if len(embeds) > 2 else None
+        return prompt_embeds, pooled_embeds
+
+    def _build_prompt_kwargs(self, prompts: List[str]) -> dict:
+        """
+        Prépare les arguments de prompt du pipeline à partir du cache d'embeddings.
+        
+        Args:
+            prompts (List[str]): Prompts positifs, un par image
+        
+        Returns:
+            dict: Embeddings mis en cache concaténés sur la dimension du batch,
+                ou prompts texte si l'encodage est impossible
+        """
+        if hasattr(self.pipeline, 'encode_prompt'):
+            try:
+                return self._build_embeds_kwargs([self._encode_prompt(prompt) for prompt in prompts])
+            except Exception as encode_e:
+                logger.warning("⚠️ Encodage du prompt impossible, passage du texte brut: %s", encode_e)
+        return {'prompt': prompts, 'negative_prompt': [NEGATIVE_PROMPT] * len(prompts)}
+
+    def _build_embeds_kwargs(self, encoded: List[tuple]) -> dict:
+        """
+        Assemble les arguments d'embeddings du pipeline, prompt négatif compris.
+        
+        Args:
+            encoded (List[tuple]): Embeddings (embeds, pooled) de chaque prompt positif
+        
+        Returns:
+            dict: Embeddings concaténés sur la dimension du batch
+        """
+        negative_embeds, negative_pooled_embeds = self._encode_prompt(NEGATIVE_PROMPT)
+        batch_size = len(encoded)
+        kwargs = {
+            'prompt_embeds': torch.cat([embeds for embeds, _ in encoded]),
+            'negative_prompt_embeds': negative_embeds.repeat(batch_size, 1, 1)
+        }
+        if negative_pooled_embeds is not None:
+            kwargs['pooled_prompt_embeds'] = torch.cat([pooled for _, pooled in encoded])
+            kwargs['negative_pooled_prompt_embeds'] = negative_pooled_embeds.repeat(batch_size, 1)
+        return kwargs
+
+    def _prepare_prompt(self, prompt: str) -> str:
+        """
+        Tronque le prompt fourni par Mistral pour respecter la limite de CLIP.
+        
+        Args:
+            prompt (str): Le prompt d'image généré par Mistral
+        
+        Returns:
+            str: Le prompt tronqué
+        """
+        # Tronquer le prompt si nécessaire pour éviter les erreurs CLIP (max 77 tokens)
+        # Le tokenizer de CLIP est interne au pipeline, nous allons donc tronquer le texte brut
+        # Une estimation simple est de limiter à environ 500 caractères pour 77 tokens
+        # C'est une solution temporaire, une meilleure approche serait d'utiliser le tokenizer réel
+        max_prompt_length = 500 # Approximation pour 77 tokens
+        
+        logger.info("Prompt original: %s", prompt)
+        processed_prompt = prompt[:max_prompt_length] if len(prompt) > max_prompt_length else prompt
+        
+        logger.info("🎨 Génération avec prompt Mistral (tronqué): %.100s...", processed_prompt)
+        return processed_prompt
+
+    def _run_pipeline(self, prompt_kwargs: dict, batch_size: int) -> Optional[np.ndarray]:
+        """
+        Exécute le pipeline sur un batch de prompts en un seul passage de l'UNet.
+        
+        Le pipeline renvoie un tenseur : la conversion en uint8 est faite sur le
+        device avant le transfert vers le CPU, sans passer par des objets PIL.
+        
+        Args:
+            prompt_kwargs (dict): Prompts ou embeddings, voir _build_prompt_kwargs
+            batch_size (int): Nombre d'images attendues
+        
+        Returns:
+            Optional[np.ndarray]: Les images générées (N, H, W, 3) en uint8 ou None en cas d'échec
+        """
+        try:
+            # Exécuter le pipeline de génération d'image
+            # Ajout de num_inference_steps pour un contrôle plus fin, valeur par défaut 50
+            # Ajout de guidance_scale pour contrôler la force du prompt, valeur par défaut 7.5
+            # inference_mode : aucun suivi autograd des tenseurs intermédiaires
+            with self._generation_lock, torch.inference_mode():
                 generation_output = self.pipeline(
-                    prompt=processed_prompt,
-                    negative_prompt="blurry, low quality, distorted, ugly, bad anatomy, text, watermark",
-                    num_inference_steps=25, # Optimisé pour DDIMScheduler
+                    **prompt_kwargs,
+                    num_inference_steps=self.num_inference_steps,
                     guidance_scale=7.5, # Force du prompt
                     height=512, # Taille fixe pour éviter les problèmes de dimensions
-                    width=512
+                    width=512,
+                    output_type="pt" # Tenseur (N, 3, H, W) dans [0, 1]
                 )
-            except Exception as pipeline_e:
-                logger.error(f"❌ Erreur lors de l'exécution du pipeline de génération: {pipeline_e}", exc_info=True)
-                return None
+        except Exception as pipeline_e:
+            logger.error("❌ Erreur lors de l'exécution du pipeline de génération: %s", pipeline_e, exc_info=True)
+            return None
+        
+        # Vérifier si la génération a produit une image valide
+        logger.debug("Type de generation_output: %s", type(generation_output))
+        logger.debug("Type de generation_output.images: %s", type(generation_output.images))
+
+        images = generation_output.images
+        if (not isinstance(images, torch.Tensor) or images.ndim != 4
+                or images.shape[0] != batch_size):
+            logger.error("❌ La génération d'image a échoué: aucune image valide (torch.Tensor) retournée.")
+            return None
+        
+        # Même quantification que la sortie PIL de diffusers, effectuée sur le device
+        return (
+            images.mul(255).round().clamp(0, 255).to(torch.uint8)
+            .permute(0, 2, 3, 1).contiguous().cpu().numpy()
+        )
+
+    def _save_image(self, image: np.ndarray) -> Optional[str]:
+        """
+        Sauvegarde une image générée dans le dossier public du frontend.
+        
+        Args:
+            image (np.ndarray): L'image (H, W, 3) en uint8 à sauvegarder
+        
+        Returns:
+            Optional[str]: Le chemin relatif de l'image ou None en cas d'échec
+        """
+        try:
+            # Horodatage en nanosecondes et suffixe aléatoire : deux générations
+            # concurrentes ne peuvent pas écraser le même fichier
+            filename = f"cocktail_{time.time_ns():x}_{secrets.token_hex(4)}.webp"
+            filepath = os.path.join(self.output_dir, filename)
+            
+            PIL.Image.fromarray(image).save(filepath, "WEBP", quality=90, method=4)
+            logger.info("✅ Image sauvegardée: %s", filename)
             
-            # Vérifier si la génération a produit une image valide
-            logger.debug(f"Type de generation_output: {type(generation_output)}")
-            logger.debug(f"Type de generation_output.images: {type(generation_output.images)}")
-            if generation_output.images:
-                logger.debug(f"Type de generation_output.images[0]: {type(generation_output.images[0])}")
+            return f"/{filename}"
+        except Exception as e:
+            logger.error("❌ Erreur sauvegarde image: %s", e)
+            return None
+
+    def _cache_path(self, prompt: str) -> str:
+        """
+        Calcule le chemin de l'image en cache pour un prompt.
+        
+        Args:
+            prompt (str): Prompt déjà tronqué
+        
+        Returns:
+            str: Chemin du fichier dans le dossier de cache
+        """
+        key = hashlib.blake2b(
+            '\0'.join((self.model_id, str(self.num_inference_steps), NEGATIVE_PROMPT, prompt)).encode(),
+            digest_size=16
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.webp")
+
+    def _get_cached_image(self, prompt: str) -> Optional[str]:
+        """
+        Publie une copie de l'image en cache pour ce prompt, si elle existe.
+        
+        Une copie est faite pour que la suppression d'un cocktail n'efface pas
+        l'entrée du cache.
+        
+        Args:
+            prompt (str): Prompt déjà tronqué
+        
+        Returns:
+            Optional[str]: Le chemin relatif de la copie publiée ou None
+        """
+        if not self.cache_dir:
+            return None
+        
+        filename = f"cocktail_{time.time_ns():x}_{secrets.token_hex(4)}.webp"
+        try:
+            shutil.copyfile(self._cache_path(prompt), os.path.join(self.output_dir, filename))
+        except FileNotFoundError:
+            return None
+        except OSError as cache_e:
+            logger.warning("⚠️ Lecture du cache d'images impossible: %s", cache_e)
+            return None
+        
+        logger.info("✅ Image servie depuis le cache: %s", filename)
+        return f"/{filename}"
+
+    def _store_cached_image(self, prompt: str, image_path: Optional[str]):
+        """
+        Copie une image générée dans le cache.
+        
+        La copie est écrite dans un fichier temporaire du dossier de cache puis
+        renommée : un lecteur concurrent ne voit jamais une image partielle.
+        
+        Args:
+            prompt (str): Prompt déjà tronqué
+            image_path (Optional[str]): Chemin relatif renvoyé par _save_image
+        """
+        if not self.cache_dir or not image_path:
+            return
+        
+        cache_path = self._cache_path(prompt)
+        tmp_path = f"{cache_path}.{secrets.token_hex(4)}.tmp"
+        try:
+            shutil.copyfile(os.path.join(self.output_dir, image_path.lstrip('/')), tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as cache_e:
+            logger.warning("⚠️ Écriture du cache d'images impossible: %s", cache_e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def generate_image(self, prompt: str) -> Optional[str]:
+        """
+        Génère une image à partir du prompt fourni par Mistral.
+        
+        Args:
+            prompt (str): Le prompt d'image généré par Mistral
+        
+        Returns:
+            Optional[str]: Le chemin relatif de l'image générée ou None en cas d'échec
+        """
+        processed_prompt = self._prepare_prompt(prompt)
+        cached_path = self._get_cached_image(processed_prompt)
+        if cached_path:
+            return cached_path
+        
+        if not self._ensure_pipeline():
+            logger.error("❌ Pipeline non initialisé")
+            return None
 
-            if generation_output.images and isinstance(generation_output.images[0], PIL.Image.Image):
-                image = generation_output.images[0]
-            else:
-                logger.error("❌ La génération d'image a échoué: aucune image valide (PIL.Image.Image) retournée.")
+        try:
+            images = self._run_pipeline(self._build_prompt_kwargs([processed_prompt]), 1)
+            if images is None:
                 return None
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"cocktail_{timestamp}.png"
-            filepath = os.path.join(self.output_dir, filename)
-            
-            image.save(filepath)
-            logger.info(f"✅ Image sauvegardée: {filename}")
+            image_path = self._save_image(images[0])
+            self._store_cached_image(processed_prompt, image_path)
+            return image_path
+
+        except Exception as e:
+            logger.error("❌ Erreur génération: %s", e)
+            return None
+
+    def encode_prompt(self, prompt: str) -> Optional[tuple]:
+        """
+        Encode un prompt une fois pour toutes, pour generate_image_from_embeds.
+        
+        Utile quand un même prompt est rendu plusieurs fois : l'encodeur de
+        texte CLIP n'est alors exécuté qu'une seule fois.
+        
+        Args:
+            prompt (str): Le prompt d'image
+        
+        Returns:
+            Optional[tuple]: (embeddings, embeddings "pooled" ou None) ou None en cas d'échec
+        """
+        if not self._ensure_pipeline() or not hasattr(self.pipeline, 'encode_prompt'):
+            logger.error("❌ Encodage du prompt non disponible")
+            return None
+        
+        try:
+            return self._encode_prompt(self._prepare_prompt(prompt))
+        except Exception as e:
+            logger.error("❌ Erreur encodage du prompt: %s", e)
+            return None
+
+    def generate_image_from_embeds(self, embeds: tuple) -> Optional[str]:
+        """
+        Génère une image à partir d'un prompt déjà encodé par encode_prompt.
+        
+        Args:
+            embeds (tuple): Embeddings renvoyés par encode_prompt
+        
+        Returns:
+            Optional[str]: Le chemin relatif de l'image générée ou None en cas d'échec
+        """
+        if not embeds or not self._ensure_pipeline():
+            logger.error("❌ Pipeline non initialisé ou embeddings manquants")
+            return None
+
+        try:
+            images = self._run_pipeline(self._build_embeds_kwargs([embeds]), 1)
+            if images is None:
+                return None
             
-            return f"/cocktail_{timestamp}.png"
+            return self._save_image(images[0])
 
         except Exception as e:
-            logger.error(f"❌ Erreur génération: {e}")
+            logger.error("❌ Erreur génération: %s", e)
             return None
 
     def generate_cocktail_image(self, cocktail_data: dict) -> Optional[str]:
@@ -158,14 +779,103 @@ class DynaPicturesService:
             return None
         
         cocktail_name = cocktail_data.get('name', 'Cocktail')
-        logger.info(f"🎨 Génération image pour: {cocktail_name}")
+        logger.info("🎨 Génération image pour: %s", cocktail_name)
         
         return self.generate_image(prompt)
     
+    def generate_images_batch(self, prompts: List[str]) -> List[Optional[str]]:
+        """
+        Génère plusieurs images en un seul appel au pipeline.
+        
+        Les prompts sont regroupés dans un même batch : les poids de l'UNet ne sont
+        lus qu'une fois par étape pour l'ensemble des images.
+        
+        Args:
+            prompts (List[str]): Prompts d'image générés par Mistral
+        
+        Returns:
+            List[Optional[str]]: Le chemin relatif de chaque image, dans l'ordre des
+                prompts, ou None en cas d'échec
+        """
+        processed_prompts = [self._prepare_prompt(prompt) for prompt in prompts]
+        results: List[Optional[str]] = [self._get_cached_image(prompt) for prompt in processed_prompts]
+        
+        # Seuls les prompts absents du cache passent dans le pipeline
+        missing = [index for index, path in enumerate(results) if path is None]
+        if not missing:
+            return results
+        if not self._ensure_pipeline():
+            logger.error("❌ Pipeline non initialisé")
+            return results
+        
+        logger.info("🎨 Génération d'un batch de %d image(s)", len(missing))
+        
+        try:
+            images = self._run_pipeline(
+                self._build_prompt_kwargs([processed_prompts[index] for index in missing]),
+                len(missing)
+            )
+            if images is None:
+                return results
+            
+            # Sauvegarde des images en parallèle (l'encodage WebP libère le GIL)
+            with ThreadPoolExecutor(max_workers=len(images)) as executor:
+                paths = list(executor.map(self._save_image, images))
+            
+            for index, path in zip(missing, paths):
+                self._store_cached_image(processed_prompts[index], path)
+                results[index] = path
+            return results
 
+        except Exception as e:
+            logger.error("❌ Erreur génération batch: %s", e)
+            return results
+    
+    def generate_cocktail_images_batch(self, cocktails: List[dict]) -> List[Optional[str]]:
+        """
+        Génère les images de plusieurs cocktails en un seul appel au pipeline.
+        
+        Args:
+            cocktails (List[dict]): Données des cocktails avec 'image_prompt' de Mistral
+        
+        Returns:
+            List[Optional[str]]: Le chemin relatif de chaque image, ou None pour les
+                cocktails sans prompt ou en cas d'échec
+        """
+        results: List[Optional[str]] = [None] * len(cocktails)
+        
+        # Seuls les cocktails disposant d'un prompt Mistral sont générés
+        indexed_prompts = [
+            (index, cocktail['image_prompt'])
+            for index, cocktail in enumerate(cocktails)
+            if cocktail and cocktail.get('image_prompt')
+        ]
+        if len(indexed_prompts) != len(cocktails):
+            logger.warning("⚠️ %d cocktail(s) sans prompt d'image ignoré(s)", len(cocktails) - len(indexed_prompts))
+        
+        paths = self.generate_images_batch([prompt for _, prompt in indexed_prompts])
+        for (index, _), path in zip(indexed_prompts, paths):
+            results[index] = path
+        return results
 
     def is_available(self) -> bool:
         """
         Vérifie si le service est disponible.
+        
+        Ne déclenche pas le chargement du pipeline : le service est considéré
+        disponible tant que le chargement n'a pas échoué.
         """
-        return self.pipeline is not None
\ No newline at end of file
+        return self.pipeline is not None or not self._pipeline_load_failed
+
+@functools.lru_cache(maxsize=1)
+def get_dynapictures_service() -> DynaPicturesService:
+    """
+    Retourne l'instance partagée du service.
+    
+    Les poids Stable Diffusion occupent plusieurs Go : tous les appelants d'un même
+    processus (application, scripts de test) doivent réutiliser le même pipeline.
+    
+    Returns:
+        DynaPicturesService: L'instance unique du service
+    """
+    return DynaPicturesService()
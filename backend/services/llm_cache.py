@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des réponses LLM pour Le Mixologue Augmenté
+
+Conserve en mémoire les cocktails déjà générés, sur deux niveaux :
+- LLMCache : correspondance exacte, par empreinte SHA-256 de la requête
+  envoyée à Mistral (modèle, messages, paramètres)
+- SemanticCache : demandes proches, par similarité cosinus des embeddings
+
+Auteur: Assistant IA
+Date: 2024
+"""
+
+import copy
+import time
+import hashlib
+import threading
+import orjson
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+
+class LLMCache:
+    """
+    Cache LRU en mémoire avec durée de vie (TTL) pour les réponses LLM parsées.
+    
+    Thread-safe : le même cache est partagé par les workers Flask et les
+    variantes asynchrones du service Mistral.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        """
+        Initialise le cache.
+        
+        Args:
+            maxsize (int): Nombre maximal d'entrées conservées
+            ttl (float): Durée de vie d'une entrée en secondes
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    @staticmethod
+    def cache_key(model: str, messages: list, temperature: float, top_p: float) -> str:
+        """
+        Calcule la clé de cache d'une requête.
+        
+        Args:
+            model (str): Modèle Mistral utilisé
+            messages (list): Messages envoyés à l'API
+            temperature (float): Température de génération
+            top_p (float): Paramètre top_p de génération
+        
+        Returns:
+            str: Empreinte SHA-256 hexadécimale de la requête normalisée
+        """
+        payload = {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'top_p': top_p
+        }
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Récupère une entrée du cache.
+        
+        Args:
+            key (str): Clé de cache
+        
+        Returns:
+            Optional[Dict]: Copie de la valeur en cache ou None si absente ou expirée
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.stats['misses'] += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return copy.deepcopy(entry[1])
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        Ajoute ou remplace une entrée du cache.
+        
+        Args:
+            key (str): Clé de cache
+            value (Dict): Valeur à conserver (copiée)
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Retourne les statistiques d'utilisation du cache.
+        
+        Returns:
+            Dict: Nombre de hits, de misses et d'entrées conservées
+        """
+        with self._lock:
+            return {**self.stats, 'size': len(self._entries)}
+
+class SemanticCache:
+    """
+    Cache sémantique des réponses LLM, indexé par embedding de la demande.
+    
+    Une demande dont l'embedding a une similarité cosinus supérieure au seuil
+    avec une demande déjà traitée est servie avec le même cocktail. L'index est
+    une matrice de vecteurs normalisés : la recherche est un simple produit
+    matriciel, suffisant pour quelques centaines d'entrées.
+    """
+    
+    def __init__(self, threshold: float = 0.92, maxsize: int = 256):
+        """
+        Initialise le cache.
+        
+        Args:
+            threshold (float): Similarité cosinus minimale pour un hit
+            maxsize (int): Nombre maximal d'entrées conservées (les plus anciennes sont évincées)
+        """
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._vectors: Optional[np.ndarray] = None
+        self._values: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+    
+    def search(self, embedding) -> Optional[Dict[str, Any]]:
+        """
+        Cherche la réponse associée à la demande la plus proche.
+        
+        Args:
+            embedding: Embedding de la demande
+        
+        Returns:
+            Optional[Dict]: Copie de la valeur la plus proche si elle dépasse le seuil, None sinon
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is not None:
+                scores = self._vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.stats['hits'] += 1
+                    return copy.deepcopy(self._values[best])
+            self.stats['misses'] += 1
+            return None
+    
+    def add(self, embedding, value: Dict[str, Any]):
+        """
+        Ajoute une demande et sa réponse à l'index.
+        
+        Args:
+            embedding: Embedding de la demande
+            value (Dict): Valeur à conserver (copiée)
+        """
+        vector = self._normalize(embedding)[np.newaxis, :]
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = vector
+            else:
+                self._vectors = np.vstack((self._vectors, vector))[-self.maxsize:]
+            self._values.append(copy.deepcopy(value))
+            del self._values[:-self.maxsize]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Retourne les statistiques d'utilisation du cache.
+        
+        Returns:
+            Dict: Nombre de hits, de misses et d'entrées conservées
+        """
+        with self._lock:
+            return {**self.stats, 'size': len(self._values)}
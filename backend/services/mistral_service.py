@@ -12,15 +12,68 @@ Date: 2024
 """
 
 import os
-import json
+import re
+import time
+import asyncio
+import functools
+import importlib.util
+import threading
+import weakref
+import orjson
 import requests
 import logging
-from typing import Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Final, Iterator, List, Optional, Any, Tuple
 from datetime import datetime
-from .dynapictures_service import DynaPicturesService
+from .llm_cache import LLMCache, SemanticCache
 
 logger = logging.getLogger(__name__)
 
+# Prompt système optimisé pour la génération de cocktails, construit une seule fois.
+# Il doit rester identique octet pour octet d'un appel à l'autre : seul le message
+# utilisateur varie, ce qui permet à Mistral de réutiliser le préfixe commun.
+# Le prompt image est demandé juste après le nom pour que la génération de
+# l'image puisse démarrer pendant que Mistral rédige le reste de la fiche
+_SYSTEM_PROMPT: Final[str] = """
+Tu es un mixologue expert et créatif travaillant dans un bar à cocktails haut de gamme à Metz. 
+Ton rôle est de créer des cocktails originaux et personnalisés selon les demandes des clients.
+
+Pour chaque demande, tu dois générer une fiche cocktail complète au format JSON strict suivant :
+
+{
+  "name": "Nom créatif et original du cocktail",
+  "image_prompt": "Prompt détaillé pour générer une image du cocktail avec SDXL, précise que le verre doit être visible entièrement et le background doit être noir (100 tokens max)",
+  "ingredients": [
+    "Quantité précise + Ingrédient 1",
+    "Quantité précise + Ingrédient 2",
+    "..."
+  ],
+  "description": "Histoire courte et engageante du cocktail (2-3 phrases max)",
+  "music_ambiance": "Suggestion d'ambiance musicale adaptée au cocktail"
+}
+
+Règles importantes :
+1. Le nom doit être original, créatif et évocateur
+2. Les ingrédients doivent inclure des quantités précises (cl, ml, traits, etc.)
+3. La description doit raconter une histoire ou donner du contexte
+4. L'ambiance musicale doit correspondre à l'esprit du cocktail
+5. Le prompt image doit être détaillé pour une belle photo de cocktail
+6. Réponds UNIQUEMENT en JSON valide, sans texte supplémentaire
+7. Adapte-toi aux goûts, contraintes et contexte mentionnés par le client
+8. Sois créatif mais réaliste dans les associations d'ingrédients
+"""
+
+_SYSTEM_MESSAGE: Final[Dict[str, str]] = {'role': 'system', 'content': _SYSTEM_PROMPT}
+
+# Champ de la fiche cocktail dont la valeur (chaîne ou liste de chaînes) est
+# complète dans une réponse JSON partielle
+_STREAMED_FIELD_RE = re.compile(
+    r'"(?P<field>name|description|music_ambiance|image_prompt|ingredients)"\s*:\s*'
+    r'(?P<value>"(?:[^"\\]|\\.)*"|\[(?:[^\]"]|"(?:[^"\\]|\\.)*")*\])'
+)
+
 class MistralService:
     """
     Service pour l'intégration avec l'API Mistral.
@@ -29,6 +82,19 @@ class MistralService:
     les prompts pour obtenir des réponses structurées et créatives.
     """
     
+    # Champs obligatoires d'une fiche cocktail
+    _REQUIRED_FIELDS = frozenset(('name', 'ingredients', 'description', 'music_ambiance'))
+    
+    # Longueur maximale (en caractères) de la demande transmise à Mistral
+    _MAX_USER_REQUEST_LENGTH = 2000
+    
+    # Durée (s) pendant laquelle le résultat du test de connexion est réutilisé
+    _CONNECTION_TEST_TTL = 60
+    
+    # Nombre d'échecs consécutifs ouvrant le disjoncteur, et durée d'ouverture (s)
+    _CIRCUIT_BREAKER_THRESHOLD = 5
+    _CIRCUIT_BREAKER_COOLDOWN = 60
+    
     def __init__(self):
         """
         Initialise le service Mistral avec la configuration.
@@ -45,62 +111,136 @@ class MistralService:
         
         self.model = os.getenv('MISTRAL_MODEL', 'mistral-large-latest')
         self.base_url = 'https://api.mistral.ai/v1/chat/completions'
+        self.embeddings_url = 'https://api.mistral.ai/v1/embeddings'
+        self.models_url = 'https://api.mistral.ai/v1/models'
         self.timeout = 30  # Timeout en secondes
-        self.max_retries = 3
+        self.max_retries = int(os.getenv('MISTRAL_MAX_RETRIES', '3'))
         
-        # Initialisation du service de génération d'images
-        try:
-            self.dynapictures_service = DynaPicturesService()
-            logger.info("✅ Service DynaPictures initialisé avec succès")
-        except ValueError as e:
-            logger.warning(f"⚠️ Service DynaPictures non disponible: {e}")
-            self.dynapictures_service = None
+        # Disjoncteur : après plusieurs échecs consécutifs, les appels échouent
+        # immédiatement pendant un délai au lieu d'attendre chacun le timeout
+        self._circuit_lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
         
-        # Résumé des services disponibles
-        if self.dynapictures_service:
-            logger.info("🎨 Service d'image disponible: DynaPictures (Local)")
-        else:
-            logger.warning("⚠️ Aucun service de génération d'image disponible - utilisation d'images par défaut")
+        # Dernier résultat du test de connexion : (instant du test, résultat)
+        self._connection_test: Optional[Tuple[float, bool]] = None
+        
+        # Limite des appels Mistral simultanés pour les variantes asynchrones.
+        # Un sémaphore asyncio est lié à la boucle qui l'utilise : un sémaphore est
+        # créé par boucle d'événements, à la demande (voir _get_async_semaphore)
+        self._max_concurrency = int(os.getenv('MISTRAL_MAX_CONCURRENCY', '8'))
+        self._async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._async_semaphores_lock = threading.Lock()
+        
+        # Threads dédiés aux appels bloquants (API Mistral, génération d'images)
+        # des variantes asynchrones et concurrentes
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('MISTRAL_THREADS', '16')),
+            thread_name_prefix='mistral'
+        )
+        
+        # Paramètres de génération communs à tous les appels
+        self._base_payload = {
+            'model': self.model,
+            'temperature': 0.8,  # Créativité élevée
+            # Une fiche cocktail tient en 300-400 tokens : plafond ajustable pour
+            # les modèles plus ou moins verbeux
+            'max_tokens': int(os.getenv('MISTRAL_MAX_TOKENS', '500')),
+            'top_p': 0.9,
+            'response_format': {'type': 'json_object'}  # JSON brut garanti
+        }
+        
+        # Cache des cocktails déjà générés pour une requête identique.
+        # Désactivé par défaut (MISTRAL_CACHE_TTL=0) : avec une température
+        # élevée, chaque nouvelle demande doit produire un cocktail différent
+        cache_ttl = int(os.getenv('MISTRAL_CACHE_TTL', '0'))
+        self._response_cache = LLMCache(ttl=cache_ttl) if cache_ttl > 0 else None
         
-        logger.info(f"Service Mistral initialisé avec le modèle: {self.model}")
+        # Cache sémantique des demandes proches (embeddings mistral-embed),
+        # activé en définissant le seuil de similarité MNS_SEMANTIC_CACHE_THRESHOLD
+        semantic_threshold = os.getenv('MNS_SEMANTIC_CACHE_THRESHOLD')
+        self._semantic_cache = (
+            SemanticCache(threshold=float(semantic_threshold)) if semantic_threshold else None
+        )
+        # Les embeddings des demandes déjà vues ne sont calculés qu'une fois
+        self._embed = functools.lru_cache(maxsize=1024)(self._compute_embedding)
+        
+        # Session HTTP persistante : connexions TCP/TLS réutilisées entre les appels.
+        # Les erreurs transitoires sont rejouées avec backoff exponentiel aléatoirisé
+        # (pour ne pas relancer tous les clients en même temps), en respectant
+        # l'en-tête Retry-After renvoyé par Mistral sur les 429
+        retry_policy = Retry(
+            total=self.max_retries,
+            backoff_factor=0.5,
+            backoff_jitter=0.5,
+            backoff_max=10,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['POST', 'GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self._session = requests.Session()
+        self._session.mount(
+            'https://',
+            HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry_policy)
+        )
+        # Le test de connexion n'est jamais rejoué : pendant une panne, la sonde de
+        # santé doit échouer en 5 s au plus, sans backoff ni attente du Retry-After.
+        # requests choisit l'adaptateur dont le préfixe d'URL est le plus long
+        self._session.mount(self.models_url, HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        self._session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        })
+        
+        # Le service de génération d'images (torch, diffusers) n'est construit
+        # qu'à la première utilisation : voir la propriété dynapictures_service
+        
+        logger.info("Service Mistral initialisé avec le modèle: %s", self.model)
     
-    def _build_system_prompt(self) -> str:
+    @functools.cached_property
+    def dynapictures_service(self):
         """
-        Construit le prompt système optimisé pour la génération de cocktails.
+        Service de génération d'images, construit à la première utilisation.
+        
+        L'import de torch et diffusers est coûteux : les processus qui ne génèrent
+        que des fiches cocktails (scripts de test, workers sans GPU) ne le paient pas.
+        Toute erreur de construction est convertie en None : cached_property ne
+        mémorisant pas les exceptions, une erreur propagée serait relevée à chaque accès.
         
         Returns:
-            str: Prompt système détaillé
+            Optional[DynaPicturesService]: Le service ou None s'il est indisponible
         """
-        return """
-Tu es un mixologue expert et créatif travaillant dans un bar à cocktails haut de gamme à Metz. 
-Ton rôle est de créer des cocktails originaux et personnalisés selon les demandes des clients.
-
-Pour chaque demande, tu dois générer une fiche cocktail complète au format JSON strict suivant :
-
-{
-  "name": "Nom créatif et original du cocktail",
-  "ingredients": [
-    "Quantité précise + Ingrédient 1",
-    "Quantité précise + Ingrédient 2",
-    "..."
-  ],
-  "description": "Histoire courte et engageante du cocktail (2-3 phrases max)",
-  "music_ambiance": "Suggestion d'ambiance musicale adaptée au cocktail",
-  "image_prompt": "Prompt détaillé pour générer une image du cocktail avec SDXL, précise que le verre doit être visible entièrement et le background doit être noir (100 tokens max)"
-}
-
-Règles importantes :
-1. Le nom doit être original, créatif et évocateur
-2. Les ingrédients doivent inclure des quantités précises (cl, ml, traits, etc.)
-3. La description doit raconter une histoire ou donner du contexte
-4. L'ambiance musicale doit correspondre à l'esprit du cocktail
-5. Le prompt image doit être détaillé pour une belle photo de cocktail
-6. Réponds UNIQUEMENT en JSON valide, sans texte supplémentaire
-7. Adapte-toi aux goûts, contraintes et contexte mentionnés par le client
-8. Sois créatif mais réaliste dans les associations d'ingrédients
-"""
+        try:
+            from .dynapictures_service import get_dynapictures_service
+            service = get_dynapictures_service()
+            logger.info("✅ Service DynaPictures initialisé avec succès")
+            logger.info("🎨 Service d'image disponible: DynaPictures (Local)")
+            return service
+        except Exception as e:
+            logger.warning("⚠️ Service DynaPictures non disponible: %s", e)
+            logger.warning("⚠️ Aucun service de génération d'image disponible - utilisation d'images par défaut")
+            return None
+    
+    def close(self):
+        """
+        Ferme la session HTTP, libère les connexions du pool et arrête les threads.
+        """
+        self._session.close()
+        self._executor.shutdown(wait=False)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
-    def _build_user_prompt(self, user_request: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _build_user_prompt(user_request: str) -> str:
         """
         Construit le prompt utilisateur à partir de la demande.
         
@@ -127,64 +267,101 @@ Réponds uniquement avec le JSON de la fiche cocktail.
         Returns:
             Optional[Dict]: Réponse de l'API ou None en cas d'erreur
         """
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+        if self._circuit_is_open():
+            logger.error("API Mistral indisponible (disjoncteur ouvert), appel ignoré")
+            return None
         
-        payload = {
-            'model': self.model,
-            'messages': messages,
-            'temperature': 0.8,  # Créativité élevée
-            'max_tokens': 1000,
-            'top_p': 0.9
-        }
+        payload = {**self._base_payload, 'messages': messages}
         
-        for attempt in range(self.max_retries):
-            try:
-                logger.info(f"Tentative {attempt + 1}/{self.max_retries} d'appel à l'API Mistral")
-                
-                response = requests.post(
-                    self.base_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
-                
-                response.raise_for_status()
-                
-                data = response.json()
-                logger.info("Réponse reçue de l'API Mistral avec succès")
-                
-                return data
-                
-            except requests.exceptions.Timeout:
-                logger.warning(f"Timeout lors de la tentative {attempt + 1}")
-                if attempt == self.max_retries - 1:
-                    logger.error("Échec définitif : timeout de l'API Mistral")
-                    
-            except requests.exceptions.HTTPError as e:
-                logger.error(f"Erreur HTTP {e.response.status_code}: {e.response.text}")
-                if e.response.status_code == 401:
-                    logger.error("Clé API Mistral invalide")
-                    break
-                elif e.response.status_code == 429:
-                    logger.warning("Limite de taux atteinte, nouvelle tentative...")
-                    continue
-                else:
-                    break
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Erreur de requête: {str(e)}")
-                if attempt == self.max_retries - 1:
-                    logger.error("Échec définitif de la requête")
-                    
-            except Exception as e:
-                logger.error(f"Erreur inattendue: {str(e)}")
-                break
+        try:
+            logger.info("Appel à l'API Mistral")
+            
+            # Les nouvelles tentatives (429, 5xx, erreurs réseau) sont gérées par la
+            # politique Retry de l'adaptateur HTTP, avec backoff exponentiel
+            response = self._session.post(
+                self.base_url,
+                data=orjson.dumps(payload),
+                timeout=self.timeout
+            )
+            
+            response.raise_for_status()
+            
+            data = orjson.loads(response.content)
+            logger.info("Réponse reçue de l'API Mistral avec succès")
+            
+            self._record_api_result(success=True)
+            return data
+        
+        except requests.exceptions.Timeout as e:
+            logger.error("Échec définitif : timeout de l'API Mistral")
+            self._record_api_failure(e)
+        
+        except requests.exceptions.HTTPError as e:
+            logger.error("Erreur HTTP %s: %s", e.response.status_code, e.response.text)
+            if e.response.status_code == 401:
+                logger.error("Clé API Mistral invalide")
+            elif e.response.status_code == 429:
+                logger.error("Limite de taux toujours atteinte après les nouvelles tentatives")
+            self._record_api_failure(e)
+        
+        except requests.exceptions.RequestException as e:
+            logger.error("Erreur de requête: %s", e)
+            logger.error("Échec définitif de la requête")
+            self._record_api_failure(e)
+        
+        except Exception as e:
+            logger.error("Erreur inattendue: %s", e)
         
         return None
     
+    def _circuit_is_open(self) -> bool:
+        """
+        Indique si le disjoncteur est ouvert (appels à l'API suspendus).
+        
+        Returns:
+            bool: True si les appels doivent échouer immédiatement
+        """
+        with self._circuit_lock:
+            return time.monotonic() < self._circuit_open_until
+    
+    def _record_api_result(self, success: bool):
+        """
+        Met à jour le disjoncteur après un appel à l'API.
+        
+        Args:
+            success (bool): True si l'appel a abouti
+        """
+        with self._circuit_lock:
+            if success:
+                self._consecutive_failures = 0
+                return
+            
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self._CIRCUIT_BREAKER_THRESHOLD:
+                self._circuit_open_until = time.monotonic() + self._CIRCUIT_BREAKER_COOLDOWN
+                self._consecutive_failures = 0
+                logger.warning(
+                    "%d échecs consécutifs de l'API Mistral, appels suspendus pendant %d s",
+                    self._CIRCUIT_BREAKER_THRESHOLD, self._CIRCUIT_BREAKER_COOLDOWN
+                )
+    
+    def _record_api_failure(self, error: requests.exceptions.RequestException):
+        """
+        Compte un échec dans le disjoncteur s'il traduit une indisponibilité de l'API.
+        
+        Seuls les timeouts, erreurs de connexion, 429 et 5xx sont comptés : une
+        requête refusée (400, 401, 422...) prouve au contraire que l'API répond.
+        
+        Args:
+            error (requests.exceptions.RequestException): Erreur de l'appel
+        """
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            self._record_api_result(success=False)
+        elif isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status_code = error.response.status_code
+            if status_code == 429 or status_code >= 500:
+                self._record_api_result(success=False)
+    
     def _parse_cocktail_response(self, api_response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Parse la réponse de l'API Mistral pour extraire les données du cocktail.
@@ -202,28 +379,27 @@ Réponds uniquement avec le JSON de la fiche cocktail.
                 return None
             
             content = api_response['choices'][0]['message']['content']
-            logger.debug(f"Contenu brut de Mistral: {content}")
-            
-            # Nettoyage du contenu (suppression des balises markdown si présentes)
-            content = content.strip()
-            if content.startswith('```json'):
-                content = content[7:]
-            if content.endswith('```'):
-                content = content[:-3]
-            content = content.strip()
+            logger.debug("Contenu brut de Mistral: %s", content)
             
-            # Parse du JSON
-            cocktail_data = json.loads(content)
+            # Parse du JSON : le mode JSON de Mistral exclut les balises markdown ;
+            # si le modèle en a tout de même ajouté (ou du texte autour), seul
+            # l'objet entre la première et la dernière accolade est conservé
+            try:
+                cocktail_data = orjson.loads(content)
+            except orjson.JSONDecodeError:
+                start, end = content.find('{'), content.rfind('}')
+                if start < 0 or end < start:
+                    raise
+                cocktail_data = orjson.loads(content[start:end + 1])
             
             # Validation des champs requis
-            required_fields = ['name', 'ingredients', 'description', 'music_ambiance']
-            for field in required_fields:
-                if field not in cocktail_data:
-                    logger.error(f"Champ requis manquant: {field}")
-                    return None
+            missing_fields = self._REQUIRED_FIELDS.difference(cocktail_data)
+            if missing_fields:
+                logger.error("Champs requis manquants: %s", sorted(missing_fields))
+                return None
             
             # Validation des types
-            if not isinstance(cocktail_data['ingredients'], list):
+            if type(cocktail_data['ingredients']) is not list:
                 logger.error("Le champ 'ingredients' doit être une liste")
                 return None
             
@@ -233,23 +409,25 @@ Réponds uniquement avec le JSON de la fiche cocktail.
                     cocktail_data['name']
                 )
             
-            logger.info(f"Cocktail parsé avec succès: {cocktail_data['name']}")
+            logger.info("Cocktail parsé avec succès: %s", cocktail_data['name'])
             return cocktail_data
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Erreur de parsing JSON: {str(e)}")
-            logger.error(f"Contenu reçu: {content[:200]}...")
+        
+        except orjson.JSONDecodeError as e:
+            logger.error("Erreur de parsing JSON: %s", e)
+            logger.error("Contenu reçu: %.200s...", content)
             return None
-            
+        
         except KeyError as e:
-            logger.error(f"Structure de réponse inattendue: {str(e)}")
+            logger.error("Structure de réponse inattendue: %s", e)
             return None
-            
+        
         except Exception as e:
-            logger.error(f"Erreur lors du parsing de la réponse: {str(e)}")
+            logger.error("Erreur lors du parsing de la réponse: %s", e)
             return None
     
-    def _generate_default_image_prompt(self, cocktail_name: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _generate_default_image_prompt(cocktail_name: str) -> str:
         """
         Génère un prompt image par défaut si Mistral n'en fournit pas.
         
@@ -265,36 +443,49 @@ Photo professionnelle du cocktail "{cocktail_name}" dans un verre élégant,
 hyper-réaliste, 4K, composition esthétique
 """
     
-    def generate_cocktail(self, user_request: str) -> Optional[Dict[str, Any]]:
+    def _build_cocktail_messages(self, user_request: str) -> Optional[list]:
         """
-        Génère un cocktail basé sur la demande de l'utilisateur.
+        Valide la demande de l'utilisateur et construit les messages pour l'API.
         
         Args:
             user_request (str): Demande de l'utilisateur
         
         Returns:
-            Optional[Dict]: Données du cocktail généré ou None en cas d'erreur
+            Optional[list]: Messages pour l'API Mistral ou None si la demande est vide
         """
         if not user_request or not user_request.strip():
             logger.error("Demande utilisateur vide")
             return None
         
-        logger.info(f"Génération d'un cocktail pour: {user_request[:100]}...")
+        # Troncature des demandes trop longues (coupure sur une frontière de mot)
+        if len(user_request) > self._MAX_USER_REQUEST_LENGTH:
+            logger.warning(
+                "Demande utilisateur tronquée de %d à %d caractères",
+                len(user_request), self._MAX_USER_REQUEST_LENGTH
+            )
+            user_request = user_request[:self._MAX_USER_REQUEST_LENGTH].rsplit(' ', 1)[0]
+        
+        logger.info("Génération d'un cocktail pour: %.100s...", user_request)
         
         # Construction des messages pour l'API
-        messages = [
-            {
-                'role': 'system',
-                'content': self._build_system_prompt()
-            },
+        return [
+            _SYSTEM_MESSAGE,
             {
                 'role': 'user',
                 'content': self._build_user_prompt(user_request)
             }
         ]
+    
+    def _cocktail_from_api_response(self, api_response: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Extrait le cocktail de la réponse de l'API en journalisant les échecs.
         
-        # Appel à l'API Mistral
-        api_response = self._make_api_request(messages)
+        Args:
+            api_response (Optional[Dict]): Réponse de l'API ou None si l'appel a échoué
+        
+        Returns:
+            Optional[Dict]: Données du cocktail généré ou None en cas d'erreur
+        """
         if not api_response:
             logger.error("Échec de l'appel à l'API Mistral")
             return None
@@ -305,37 +496,273 @@ hyper-réaliste, 4K, composition esthétique
             logger.error("Échec du parsing de la réponse Mistral")
             return None
         
-        logger.info(f"Cocktail généré avec succès: {cocktail_data['name']}")
+        logger.info("Cocktail généré avec succès: %s", cocktail_data['name'])
+        return cocktail_data
+    
+    def _compute_embedding(self, text: str) -> Tuple[float, ...]:
+        """
+        Calcule l'embedding d'un texte avec le modèle mistral-embed.
+        
+        Args:
+            text (str): Texte à encoder
+        
+        Returns:
+            Tuple[float, ...]: Vecteur d'embedding
+        
+        Raises:
+            requests.exceptions.RequestException: Si l'appel à l'API échoue
+        """
+        response = self._session.post(
+            self.embeddings_url,
+            data=orjson.dumps({'model': 'mistral-embed', 'input': [text]}),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return tuple(orjson.loads(response.content)['data'][0]['embedding'])
+    
+    def _lookup_cache(self, user_request: str, messages: list) -> Tuple[tuple, Optional[Dict[str, Any]]]:
+        """
+        Cherche un cocktail déjà généré : correspondance exacte des messages,
+        puis demande sémantiquement proche.
+        
+        Args:
+            user_request (str): Demande de l'utilisateur
+            messages (list): Messages pour l'API Mistral
+        
+        Returns:
+            Tuple: ((clé de cache, embedding), cocktail en cache ou None), la clé et
+                l'embedding valant None quand le cache correspondant est désactivé
+        """
+        cache_key = embedding = None
+        
+        if self._response_cache is not None:
+            cache_key = LLMCache.cache_key(
+                self.model, messages,
+                self._base_payload['temperature'], self._base_payload['top_p']
+            )
+            cocktail_data = self._response_cache.get(cache_key)
+            if cocktail_data:
+                logger.info("Cocktail servi depuis le cache: %s", cocktail_data['name'])
+                return (cache_key, embedding), cocktail_data
+        
+        if self._semantic_cache is not None:
+            try:
+                embedding = self._embed(user_request.strip())
+            except Exception as e:
+                logger.warning("Embedding de la demande impossible, cache sémantique ignoré: %s", e)
+            else:
+                cocktail_data = self._semantic_cache.search(embedding)
+                if cocktail_data:
+                    logger.info("Cocktail servi depuis le cache sémantique: %s", cocktail_data['name'])
+                    return (cache_key, embedding), cocktail_data
+        
+        return (cache_key, embedding), None
+    
+    def _store_in_cache(self, cache_entry: tuple, cocktail_data: Optional[Dict[str, Any]]):
+        """
+        Conserve un cocktail généré avec succès dans les caches actifs.
+        
+        Args:
+            cache_entry (tuple): (clé de cache, embedding) renvoyés par _lookup_cache
+            cocktail_data (Optional[Dict]): Cocktail généré ou None en cas d'échec
+        """
+        if not cocktail_data:
+            return
+        
+        cache_key, embedding = cache_entry
+        if cache_key:
+            self._response_cache.set(cache_key, cocktail_data)
+        if embedding:
+            self._semantic_cache.add(embedding, cocktail_data)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Retourne les statistiques des caches des réponses Mistral.
+        
+        Returns:
+            Dict: État de chaque cache, nombre de hits, de misses et d'entrées
+        """
+        disabled = {'enabled': False, 'hits': 0, 'misses': 0, 'size': 0}
+        stats = dict(disabled)
+        if self._response_cache is not None:
+            stats = {'enabled': True, **self._response_cache.get_stats()}
+        stats['semantic'] = dict(disabled)
+        if self._semantic_cache is not None:
+            stats['semantic'] = {'enabled': True, **self._semantic_cache.get_stats()}
+        return stats
+    
+    def generate_cocktail(self, user_request: str) -> Optional[Dict[str, Any]]:
+        """
+        Génère un cocktail basé sur la demande de l'utilisateur.
+        
+        Args:
+            user_request (str): Demande de l'utilisateur
+        
+        Returns:
+            Optional[Dict]: Données du cocktail généré ou None en cas d'erreur
+        """
+        messages = self._build_cocktail_messages(user_request)
+        if not messages:
+            return None
+        
+        cache_entry, cocktail_data = self._lookup_cache(user_request, messages)
+        if cocktail_data:
+            return cocktail_data
+        
+        # Appel à l'API Mistral
+        cocktail_data = self._cocktail_from_api_response(self._make_api_request(messages))
+        self._store_in_cache(cache_entry, cocktail_data)
         return cocktail_data
     
+    def _stream_completion(self, messages: list) -> Iterator[str]:
+        """
+        Effectue une requête en streaming (SSE) à l'API Mistral.
+        
+        Args:
+            messages (list): Messages pour l'API Mistral
+        
+        Yields:
+            str: Fragments successifs du contenu généré (aucun si le disjoncteur est ouvert)
+        
+        Raises:
+            requests.exceptions.RequestException: Si l'appel à l'API échoue
+        """
+        if self._circuit_is_open():
+            logger.error("API Mistral indisponible (disjoncteur ouvert), appel ignoré")
+            return
+        
+        payload = {**self._base_payload, 'messages': messages, 'stream': True}
+        
+        logger.info("Appel à l'API Mistral (streaming)")
+        try:
+            with self._session.post(
+                self.base_url,
+                data=orjson.dumps(payload),
+                headers={'Accept': 'text/event-stream'},
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                
+                for line in response.iter_lines():
+                    if not line.startswith(b'data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == b'[DONE]':
+                        break
+                    
+                    choices = orjson.loads(data).get('choices')
+                    if choices:
+                        fragment = choices[0].get('delta', {}).get('content')
+                        if fragment:
+                            yield fragment
+        
+        except requests.exceptions.RequestException as e:
+            self._record_api_failure(e)
+            raise
+        
+        self._record_api_result(success=True)
+    
+    def stream_cocktail(self, user_request: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Génère un cocktail en streaming, champ par champ.
+        
+        Chaque champ de la fiche est transmis dès que sa valeur est complète dans
+        la réponse de Mistral, sans attendre la fin de la génération : le client
+        peut afficher le nom du cocktail après quelques tokens seulement.
+        
+        Args:
+            user_request (str): Demande de l'utilisateur
+        
+        Yields:
+            Tuple[str, Any]: (nom du champ, valeur) pour chaque champ complété, puis
+                ('cocktail', données complètes du cocktail ou None en cas d'erreur)
+        """
+        messages = self._build_cocktail_messages(user_request)
+        if not messages:
+            yield 'cocktail', None
+            return
+        
+        cache_entry, cocktail_data = self._lookup_cache(user_request, messages)
+        if cocktail_data:
+            yield 'cocktail', cocktail_data
+            return
+        
+        content = ''
+        streamed_fields = set()
+        try:
+            for fragment in self._stream_completion(messages):
+                content += fragment
+                for match in _STREAMED_FIELD_RE.finditer(content):
+                    field = match.group('field')
+                    if field in streamed_fields:
+                        continue
+                    try:
+                        value = orjson.loads(match.group('value'))
+                    except orjson.JSONDecodeError:
+                        continue
+                    streamed_fields.add(field)
+                    yield field, value
+        
+        except requests.exceptions.HTTPError as e:
+            logger.error("Erreur HTTP %s: %s", e.response.status_code, e.response.text)
+            yield 'cocktail', None
+            return
+        
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logger.error("Erreur lors du streaming de la réponse Mistral: %s", e)
+            yield 'cocktail', None
+            return
+        
+        # Validation de la fiche complète, comme pour une réponse non streamée
+        api_response = {'choices': [{'message': {'content': content}}]} if content else None
+        cocktail_data = self._cocktail_from_api_response(api_response)
+        self._store_in_cache(cache_entry, cocktail_data)
+        yield 'cocktail', cocktail_data
+    
     def test_connection(self) -> bool:
         """
         Teste la connexion à l'API Mistral.
         
+        Le résultat est réutilisé pendant _CONNECTION_TEST_TTL secondes : des
+        sondes de santé fréquentes ne déclenchent pas un appel payant à chaque fois.
+        
+        Returns:
+            bool: True si la connexion fonctionne, False sinon
+        """
+        now = time.monotonic()
+        if self._connection_test and now - self._connection_test[0] < self._CONNECTION_TEST_TTL:
+            return self._connection_test[1]
+        
+        result = self._test_connection()
+        self._connection_test = (now, result)
+        return result
+    
+    def _test_connection(self) -> bool:
+        """
+        Interroge la liste des modèles pour tester la connexion.
+        
+        L'appel valide la clé API sans lancer de génération : il ne consomme
+        aucun token et répond en quelques dizaines de millisecondes. Il passe par
+        un adaptateur sans nouvelles tentatives : une panne est signalée en 5 s au plus.
+        
         Returns:
             bool: True si la connexion fonctionne, False sinon
         """
         try:
             logger.info("Test de connexion à l'API Mistral...")
             
-            test_messages = [
-                {
-                    'role': 'user',
-                    'content': 'Réponds simplement "OK" pour tester la connexion.'
-                }
-            ]
+            response = self._session.get(self.models_url, timeout=5)
             
-            response = self._make_api_request(test_messages)
-            
-            if response and 'choices' in response:
+            if response.status_code == 200:
                 logger.info("Test de connexion Mistral réussi")
                 return True
             else:
-                logger.error("Test de connexion Mistral échoué")
+                logger.error("Test de connexion Mistral échoué: HTTP %s", response.status_code)
                 return False
-                
+        
         except Exception as e:
-            logger.error(f"Erreur lors du test de connexion: {str(e)}")
+            logger.error("Erreur lors du test de connexion: %s", e)
             return False
     
     def generate_image(self, cocktail_data: Dict[str, Any]) -> Optional[str]:
@@ -353,14 +780,14 @@ hyper-réaliste, 4K, composition esthétique
             return None
         
         cocktail_name = cocktail_data.get('name', 'Cocktail Inconnu')
-        logger.info(f"🎨 Génération d'image pour: {cocktail_name}")
+        logger.info("🎨 Génération d'image pour: %s", cocktail_name)
         
         # Génération avec DynaPictures
         if self.dynapictures_service:
             logger.info("🎨 Génération avec DynaPictures...")
             result = self.dynapictures_service.generate_cocktail_image(cocktail_data)
             if result:
-                logger.info(f"✅ Image générée avec DynaPictures: {result}")
+                logger.info("✅ Image générée avec DynaPictures: %s", result)
                 return result
             else:
                 logger.warning("⚠️ Échec de génération avec DynaPictures")
@@ -369,6 +796,215 @@ hyper-réaliste, 4K, composition esthétique
         logger.warning("⚠️ Service de génération non disponible, utilisation de l'image par défaut")
         return "/default.webp"
     
+    def generate_cocktail_with_image(self, user_request: str) -> Optional[Dict[str, Any]]:
+        """
+        Génère un cocktail et son image en recouvrant les deux générations.
+        
+        La fiche est reçue en streaming : l'image est lancée dans le pool de
+        threads dès que le prompt image est complet, pendant que Mistral termine
+        les autres champs.
+        
+        N'est pas appelée par les routes Flask : le frontend enchaîne
+        /api/cocktails/generate (ou sa variante streamée) puis
+        /api/cocktails/generate-image. Cette méthode sert aux appelants Python
+        qui veulent la fiche et l'image en un seul appel.
+        
+        Args:
+            user_request (str): Demande de l'utilisateur
+        
+        Returns:
+            Optional[Dict]: Données du cocktail, avec le chemin de son image dans
+                'image_path', ou None en cas d'erreur
+        """
+        partial_cocktail = {}
+        image_future = None
+        cocktail_data = None
+        
+        for field, value in self.stream_cocktail(user_request):
+            if field == 'cocktail':
+                cocktail_data = value
+            else:
+                partial_cocktail[field] = value
+                if field == 'image_prompt' and image_future is None:
+                    image_future = self._executor.submit(self.generate_image, dict(partial_cocktail))
+        
+        if not cocktail_data:
+            # Fiche invalide : l'image lancée par anticipation ne sera jamais
+            # référencée, elle est annulée ou supprimée dès sa génération terminée
+            if image_future is not None and not image_future.cancel():
+                image_future.add_done_callback(self._discard_image_future)
+            return None
+        
+        # Réponse servie depuis le cache : le prompt image n'a pas été streamé
+        if image_future is None:
+            image_future = self._executor.submit(self.generate_image, cocktail_data)
+        
+        cocktail_data['image_path'] = image_future.result()
+        return cocktail_data
+    
+    def _discard_image_future(self, image_future):
+        """
+        Supprime l'image produite par une génération dont la fiche a été rejetée.
+        
+        Args:
+            image_future (Future): Génération d'image terminée
+        """
+        if image_future.exception() is not None:
+            return
+        image_path = image_future.result()
+        # L'image par défaut est un fichier statique partagé : elle n'est jamais supprimée
+        if not image_path or image_path == "/default.webp" or not self.dynapictures_service:
+            return
+        
+        image_full_path = os.path.join(self.dynapictures_service.output_dir, os.path.basename(image_path))
+        try:
+            os.remove(image_full_path)
+            logger.info("🗑️ Image orpheline supprimée: %s", image_path)
+        except OSError as e:
+            logger.warning("⚠️ Impossible de supprimer l'image orpheline %s: %s", image_path, e)
+    
+    def generate_cocktail_concurrent(self, user_requests: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Génère plusieurs cocktails en parallèle depuis du code synchrone.
+        
+        Args:
+            user_requests (List[str]): Demandes des utilisateurs
+        
+        Returns:
+            List[Optional[Dict]]: Cocktails générés, dans l'ordre des demandes
+                (None pour chaque demande en échec)
+        """
+        return list(self._executor.map(self.generate_cocktail, user_requests))
+    
+    async def _run_in_executor(self, func, *args):
+        """
+        Exécute une fonction bloquante dans le pool de threads du service.
+        
+        Args:
+            func: Fonction à exécuter
+            *args: Arguments de la fonction
+        
+        Returns:
+            Le résultat de la fonction
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        """
+        Retourne le sémaphore limitant les appels simultanés de la boucle courante.
+        
+        Returns:
+            asyncio.Semaphore: Sémaphore propre à la boucle d'événements en cours
+        """
+        loop = asyncio.get_running_loop()
+        with self._async_semaphores_lock:
+            semaphore = self._async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self._max_concurrency)
+            return semaphore
+    
+    async def _make_api_request_async(self, messages: list) -> Optional[Dict[str, Any]]:
+        """
+        Variante asynchrone de _make_api_request.
+        
+        Seul l'appel HTTP est exécuté dans un thread : il réutilise ainsi la session
+        persistante et sa politique de nouvelles tentatives. Le nombre d'appels
+        simultanés est borné par MISTRAL_MAX_CONCURRENCY pour respecter les
+        limites de l'API.
+        
+        Args:
+            messages (list): Messages pour l'API Mistral
+        
+        Returns:
+            Optional[Dict]: Réponse de l'API ou None en cas d'erreur
+        """
+        async with self._get_async_semaphore():
+            return await self._run_in_executor(self._make_api_request, messages)
+    
+    async def agenerate_cocktail(self, user_request: str) -> Optional[Dict[str, Any]]:
+        """
+        Variante asynchrone de generate_cocktail, combinable avec asyncio.gather.
+        
+        Args:
+            user_request (str): Demande de l'utilisateur
+        
+        Returns:
+            Optional[Dict]: Données du cocktail généré ou None en cas d'erreur
+        """
+        messages = self._build_cocktail_messages(user_request)
+        if not messages:
+            return None
+        
+        # La recherche sémantique appelle l'API d'embeddings : hors de la boucle
+        cache_entry, cocktail_data = await self._run_in_executor(self._lookup_cache, user_request, messages)
+        if cocktail_data:
+            return cocktail_data
+        
+        api_response = await self._make_api_request_async(messages)
+        cocktail_data = self._cocktail_from_api_response(api_response)
+        self._store_in_cache(cache_entry, cocktail_data)
+        return cocktail_data
+    
+    async def generate_cocktails_batch(self, user_requests: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Génère plusieurs cocktails en parallèle.
+        
+        Les appels à l'API sont lancés simultanément (bornés par
+        MISTRAL_MAX_CONCURRENCY) : la durée totale est celle de l'appel le plus
+        lent plutôt que la somme des appels.
+        
+        Args:
+            user_requests (List[str]): Demandes des utilisateurs
+        
+        Returns:
+            List[Optional[Dict]]: Cocktails générés, dans l'ordre des demandes
+                (None pour chaque demande en échec)
+        
+        Raises:
+            Exception: Toute erreur autre qu'un échec de requête ou de parsing
+                (erreur de programmation), une fois toutes les demandes terminées
+        """
+        results = await asyncio.gather(
+            *(self.agenerate_cocktail(user_request) for user_request in user_requests),
+            return_exceptions=True
+        )
+        
+        cocktails = []
+        for user_request, result in zip(user_requests, results):
+            if isinstance(result, (requests.exceptions.RequestException, orjson.JSONDecodeError)):
+                logger.error("Erreur lors de la génération du cocktail '%s': %s", user_request[:100], result)
+                result = None
+            elif isinstance(result, BaseException):
+                raise result
+            cocktails.append(result)
+        return cocktails
+    
+    async def agenerate_cocktail_with_image(self, user_request: str) -> Optional[Dict[str, Any]]:
+        """
+        Variante asynchrone de generate_cocktail_with_image, exécutée dans un thread.
+        
+        Args:
+            user_request (str): Demande de l'utilisateur
+        
+        Returns:
+            Optional[Dict]: Données du cocktail avec 'image_path' ou None en cas d'erreur
+        """
+        # Hors du pool du service : la génération de l'image y est soumise et
+        # attendue, l'occuper ici pourrait l'épuiser et bloquer l'attente
+        return await asyncio.to_thread(self.generate_cocktail_with_image, user_request)
+    
+    async def agenerate_image(self, cocktail_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Variante asynchrone de generate_image, exécutée dans un thread.
+        
+        Args:
+            cocktail_data: Données complètes du cocktail
+        
+        Returns:
+            Optional[str]: Chemin relatif de l'image générée ou None
+        """
+        return await self._run_in_executor(self.generate_image, cocktail_data)
+    
     def is_image_service_available(self) -> bool:
         """
         Vérifie si un service de génération d'images est disponible.
@@ -377,9 +1013,13 @@ hyper-réaliste, 4K, composition esthétique
             bool: True si un service d'image est disponible, False sinon
         """
         try:
-            return self.dynapictures_service and self.dynapictures_service.is_available()
+            if 'dynapictures_service' not in self.__dict__:
+                # Service pas encore construit : on vérifie seulement que ses
+                # dépendances sont installées, sans les importer
+                return all(importlib.util.find_spec(module) for module in ('torch', 'diffusers'))
+            return self.dynapictures_service is not None and self.dynapictures_service.is_available()
         except Exception as e:
-            logger.error(f"Erreur lors de la vérification du service d'image: {e}")
+            logger.error("Erreur lors de la vérification du service d'image: %s", e)
             return False
     
     def get_image_service_type(self) -> Optional[str]:
@@ -390,9 +1030,9 @@ hyper-réaliste, 4K, composition esthétique
             Optional[str]: Le nom du service d'image ou None si aucun n'est disponible
         """
         try:
-            if self.dynapictures_service and self.dynapictures_service.is_available():
+            if self.is_image_service_available():
                 return "DynaPictures (Local)"
             return None
         except Exception as e:
-            logger.error(f"Erreur lors de la détermination du type de service d'image: {e}")
+            logger.error("Erreur lors de la détermination du type de service d'image: %s", e)
             return None
\ No newline at end of file
@@ -4,110 +4,192 @@ Script de test pour démontrer la sélection automatique de modèles Stable Diff
 et les améliorations apportées au système de génération d'images.
 """
 
+import argparse
+import asyncio
+import logging
 import requests
-import json
 import time
 from typing import Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+GENERATE_IMAGE_URL = 'http://localhost:5001/api/cocktails/generate-image'
+COCKTAIL_ID = 16
+
+# Session partagée : les connexions au backend sont réutilisées entre les requêtes,
+# et les erreurs transitoires du serveur (502, 503, 504) sont rejouées
+session = requests.Session()
+session.mount('http://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        # POST est exclu par défaut des méthodes rejouées par urllib3
+        allowed_methods=frozenset(['HEAD', 'GET', 'POST']),
+        # Après la dernière tentative, la réponse d'erreur est renvoyée telle quelle
+        # (et son statut affiché) au lieu de lever RetryError
+        raise_on_status=False
+    )
+))
 
 def test_model_selection_and_generation():
     """
     Teste la sélection automatique de modèle et la génération d'image optimisée.
     """
-    print("🧪 Test du nouveau système de modèles Stable Diffusion")
-    print("=" * 60)
+    logger.info("🧪 Test du nouveau système de modèles Stable Diffusion")
+    logger.info("%s", "=" * 60)
     
     # Test de génération d'image pour un cocktail existant
-    cocktail_id = 16
-    url = 'http://localhost:5001/api/cocktails/generate-image'
+    cocktail_id = COCKTAIL_ID
+    url = GENERATE_IMAGE_URL
     
-    print(f"\n🍹 Test de génération d'image pour le cocktail ID: {cocktail_id}")
-    print(f"📡 URL: {url}")
+    logger.info("\n🍹 Test de génération d'image pour le cocktail ID: %s", cocktail_id)
+    logger.info("📡 URL: %s", url)
     
     try:
         # Mesurer le temps de génération
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
-        response = requests.post(url, json={'cocktail_id': cocktail_id})
+        response = session.post(url, json={'cocktail_id': cocktail_id})
         
-        end_time = time.time()
-        generation_time = end_time - start_time
+        end_time = time.perf_counter_ns()
+        generation_time = (end_time - start_time) / 1e9
         
-        print(f"\n⏱️ Temps de génération: {generation_time:.2f} secondes")
-        print(f"📊 Status Code: {response.status_code}")
+        logger.info("\n⏱️ Temps de génération: %.2f secondes", generation_time)
+        logger.info("📊 Status Code: %s", response.status_code)
         
         if response.status_code == 200:
             data = response.json()
-            print(f"\n✅ Génération réussie !")
-            print(f"🎯 Cocktail: {data.get('cocktail_name', 'N/A')}")
-            print(f"🖼️ Image URL: {data.get('image_url', 'N/A')}")
+            logger.info("\n✅ Génération réussie !")
+            logger.info("🎯 Cocktail: %s", data.get('cocktail_name', 'N/A'))
+            logger.info("🖼️ Image URL: %s", data.get('image_url', 'N/A'))
             
             # Test d'accessibilité de l'image
             if data.get('image_url'):
                 image_url = f"http://localhost:5002{data['image_url']}"
-                img_response = requests.head(image_url)
+                img_response = session.head(image_url)
                 
                 if img_response.status_code == 200:
                     content_length = img_response.headers.get('Content-Length', 'N/A')
-                    print(f"🌐 Image accessible: {img_response.status_code}")
-                    print(f"📏 Taille: {content_length} bytes")
+                    logger.info("🌐 Image accessible: %s", img_response.status_code)
+                    logger.info("📏 Taille: %s bytes", content_length)
                 else:
-                    print(f"❌ Image non accessible: {img_response.status_code}")
+                    logger.error("❌ Image non accessible: %s", img_response.status_code)
             
             return True
             
         else:
-            print(f"❌ Erreur de génération: {response.status_code}")
-            try:
-                error_data = response.json()
-                print(f"📝 Détails: {json.dumps(error_data, indent=2, ensure_ascii=False)}")
-            except:
-                print(f"📝 Réponse brute: {response.text}")
+            logger.error("❌ Erreur de génération: %s", response.status_code)
+            # Corps affiché tel quel : ni parsing ni re-sérialisation
+            logger.error("📝 Détails: %s", response.text)
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Erreur de connexion: {e}")
+        logger.error("❌ Erreur de connexion: %s", e)
         return False
     except Exception as e:
-        print(f"❌ Erreur inattendue: {e}")
+        logger.error("❌ Erreur inattendue: %s", e)
         return False
 
+async def run_concurrent_generations(n: int, concurrency: int) -> bool:
+    """
+    Lance n générations d'image, dont au plus `concurrency` simultanément.
+    
+    L'endpoint est limité à 3 générations par minute : au-delà, les réponses
+    429 comptent comme des échecs.
+    
+    Args:
+        n (int): Nombre total de générations
+        concurrency (int): Nombre maximal de requêtes en vol
+    
+    Returns:
+        bool: True si toutes les générations ont réussi
+    """
+    logger.info("🧪 Test de charge: %d générations, %d simultanées", n, concurrency)
+    logger.info("%s", "=" * 60)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def generate_once(index: int):
+        async with semaphore:
+            start_time = time.perf_counter_ns()
+            response = await asyncio.to_thread(
+                session.post, GENERATE_IMAGE_URL, json={'cocktail_id': COCKTAIL_ID}
+            )
+            generation_time = (time.perf_counter_ns() - start_time) / 1e9
+            logger.info("   #%d: %s en %.2f s", index + 1, response.status_code, generation_time)
+            return response.status_code, generation_time
+    
+    start_time = time.perf_counter_ns()
+    results = await asyncio.gather(*(generate_once(i) for i in range(n)), return_exceptions=True)
+    total_time = (time.perf_counter_ns() - start_time) / 1e9
+    
+    successes = [r for r in results if not isinstance(r, Exception) and r[0] == 200]
+    for error in (r for r in results if isinstance(r, Exception)):
+        logger.error("❌ Erreur de connexion: %s", error)
+    
+    logger.info("\n⏱️ Temps total: %.2f secondes", total_time)
+    logger.info("✅ Générations réussies: %d/%d", len(successes), n)
+    if successes:
+        average_time = sum(t for _, t in successes) / len(successes)
+        logger.info("📊 Temps moyen par génération: %.2f secondes", average_time)
+    
+    return len(successes) == n
+
 def print_system_info():
     """
     Affiche les informations sur les améliorations du système.
     """
-    print("\n🚀 Améliorations apportées au système:")
-    print("=" * 50)
-    print("📈 Sélection automatique de modèle basée sur la VRAM disponible:")
-    print("   • SDXL 1.0 (≥10GB VRAM) - Qualité supérieure, 1024x1024")
-    print("   • SD 2.1 (≥6GB VRAM) - Bon équilibre, 768x768")
-    print("   • SD 1.5 (≥4GB VRAM) - Rapide et compatible, 512x512")
-    print("\n⚙️ Paramètres optimisés par modèle:")
-    print("   • Nombre d'étapes d'inférence adapté")
-    print("   • Guidance scale optimisé")
-    print("   • Résolution native du modèle")
-    print("   • Prompts négatifs spécialisés")
-    print("\n🔧 Optimisations techniques:")
-    print("   • Gestion automatique CUDA/CPU")
-    print("   • Fallback intelligent vers SD1.5")
-    print("   • Optimisations mémoire pour SDXL")
-    print("   • Prompts limités à 40 mots (anti-troncature CLIP)")
-    print("\n💡 Avantages:")
-    print("   • Qualité d'image améliorée")
-    print("   • Adaptation automatique aux ressources")
-    print("   • Stabilité et fiabilité accrues")
-    print("   • Support des modèles les plus récents")
+    logger.info("\n🚀 Améliorations apportées au système:")
+    logger.info("%s", "=" * 50)
+    logger.info("📈 Sélection automatique de modèle basée sur la VRAM disponible:")
+    logger.info("   • SDXL 1.0 (≥10GB VRAM) - Qualité supérieure, 1024x1024")
+    logger.info("   • SD 2.1 (≥6GB VRAM) - Bon équilibre, 768x768")
+    logger.info("   • SD 1.5 (≥4GB VRAM) - Rapide et compatible, 512x512")
+    logger.info("\n⚙️ Paramètres optimisés par modèle:")
+    logger.info("   • Nombre d'étapes d'inférence adapté")
+    logger.info("   • Guidance scale optimisé")
+    logger.info("   • Résolution native du modèle")
+    logger.info("   • Prompts négatifs spécialisés")
+    logger.info("\n🔧 Optimisations techniques:")
+    logger.info("   • Gestion automatique CUDA/CPU")
+    logger.info("   • Fallback intelligent vers SD1.5")
+    logger.info("   • Optimisations mémoire pour SDXL")
+    logger.info("   • Prompts limités à 40 mots (anti-troncature CLIP)")
+    logger.info("\n💡 Avantages:")
+    logger.info("   • Qualité d'image améliorée")
+    logger.info("   • Adaptation automatique aux ressources")
+    logger.info("   • Stabilité et fiabilité accrues")
+    logger.info("   • Support des modèles les plus récents")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n', type=int, default=1,
+                        help="Nombre de générations (1 = mesure d'une seule génération)")
+    parser.add_argument('--concurrency', type=int, default=5,
+                        help="Nombre maximal de générations simultanées")
+    args = parser.parse_args()
+    
+    # Messages seuls, sans horodatage : la sortie reste celle d'un rapport de test
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
     print_system_info()
     
-    print("\n" + "=" * 60)
-    success = test_model_selection_and_generation()
+    logger.info("\n%s", "=" * 60)
+    if args.n > 1:
+        success = asyncio.run(run_concurrent_generations(args.n, args.concurrency))
+    else:
+        success = test_model_selection_and_generation()
     
     if success:
-        print("\n🎉 Test réussi ! Le nouveau système de modèles fonctionne parfaitement.")
-        print("✨ Votre système peut maintenant générer des images de haute qualité")
-        print("   avec sélection automatique du meilleur modèle disponible.")
+        logger.info("\n🎉 Test réussi ! Le nouveau système de modèles fonctionne parfaitement.")
+        logger.info("✨ Votre système peut maintenant générer des images de haute qualité")
+        logger.info("   avec sélection automatique du meilleur modèle disponible.")
     else:
-        print("\n⚠️ Test échoué. Vérifiez que le serveur backend est démarré.")
+        logger.warning("\n⚠️ Test échoué. Vérifiez que le serveur backend est démarré.")
     
-    print("\n" + "=" * 60)
\ No newline at end of file
+    logger.info("\n%s", "=" * 60)
\ No newline at end of file
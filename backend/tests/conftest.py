@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Configuration pytest : rend le package services importable depuis les tests,
+comme lorsque l'application est lancée depuis le dossier backend, et fournit
+les fixtures communes.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+@pytest.fixture
+def service(monkeypatch):
+    """Service Mistral sans cache, construit sans appel réseau ; chaque test remplace les appels à l'API."""
+    from services.mistral_service import MistralService
+    monkeypatch.setenv('MISTRAL_API_KEY', 'test-key')
+    monkeypatch.delenv('MISTRAL_CACHE_TTL', raising=False)
+    monkeypatch.delenv('MNS_SEMANTIC_CACHE_THRESHOLD', raising=False)
+    mistral_service = MistralService()
+    yield mistral_service
+    mistral_service.close()
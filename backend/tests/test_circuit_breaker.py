@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests du disjoncteur des appels à l'API Mistral
+"""
+
+import io
+
+import pytest
+import requests
+
+from services.mistral_service import MistralService
+
+MESSAGES = [{'role': 'user', 'content': 'Un cocktail'}]
+
+def respond_with(service, monkeypatch, outcome):
+    """Fait renvoyer un statut HTTP (ou lever une exception) à chaque appel POST, comptés dans service.calls."""
+    service.calls = 0
+    def post(url, **kwargs):
+        service.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response.url = url
+        response.raw = io.BytesIO(b'{}')
+        return response
+    monkeypatch.setattr(service._session, 'post', post)
+
+@pytest.mark.parametrize('outcome', [503, 429, requests.exceptions.Timeout(), requests.exceptions.ConnectionError()])
+def test_outages_open_the_circuit(service, monkeypatch, outcome):
+    respond_with(service, monkeypatch, outcome)
+    for _ in range(MistralService._CIRCUIT_BREAKER_THRESHOLD):
+        assert service._make_api_request(MESSAGES) is None
+    
+    assert service._circuit_is_open()
+    assert service._make_api_request(MESSAGES) is None
+    assert service.calls == MistralService._CIRCUIT_BREAKER_THRESHOLD
+
+@pytest.mark.parametrize('status_code', [400, 401, 422])
+def test_client_errors_do_not_open_the_circuit(service, monkeypatch, status_code):
+    respond_with(service, monkeypatch, status_code)
+    for _ in range(MistralService._CIRCUIT_BREAKER_THRESHOLD + 1):
+        assert service._make_api_request(MESSAGES) is None
+    
+    assert not service._circuit_is_open()
+    assert service.calls == MistralService._CIRCUIT_BREAKER_THRESHOLD + 1
+
+def test_streaming_failures_open_the_circuit(service, monkeypatch):
+    respond_with(service, monkeypatch, 502)
+    for _ in range(MistralService._CIRCUIT_BREAKER_THRESHOLD):
+        with pytest.raises(requests.exceptions.HTTPError):
+            list(service._stream_completion(MESSAGES))
+    
+    # Disjoncteur ouvert : le flux est vide et l'API n'est plus appelée
+    assert list(service._stream_completion(MESSAGES)) == []
+    assert list(service.stream_cocktail('Un cocktail')) == [('cocktail', None)]
+    assert service.calls == MistralService._CIRCUIT_BREAKER_THRESHOLD
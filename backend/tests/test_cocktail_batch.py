@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests de la génération de cocktails en parallèle (variantes asynchrones)
+"""
+
+import asyncio
+import time
+
+import orjson
+import pytest
+import requests
+
+COCKTAIL = {
+    'name': 'Mirabelle Spritz',
+    'ingredients': ['4 cl eau-de-vie de mirabelle', '8 cl prosecco'],
+    'description': 'La Lorraine en bulles.',
+    'music_ambiance': 'Jazz manouche'
+}
+
+def api_response(messages):
+    """Réponse de l'API Mistral, renvoyée après une courte attente pour que les appels se chevauchent."""
+    time.sleep(0.01)
+    return {'choices': [{'message': {'content': orjson.dumps(COCKTAIL).decode()}}]}
+
+def test_batches_larger_than_the_limit_run_on_successive_event_loops(service, monkeypatch):
+    monkeypatch.setattr(service, '_make_api_request', api_response)
+    # Plus de demandes que MISTRAL_MAX_CONCURRENCY (8 par défaut) : certaines attendent le sémaphore
+    requests_batch = [f'demande {index}' for index in range(12)]
+    
+    # Chaque asyncio.run crée une nouvelle boucle : le sémaphore ne doit pas être partagé
+    for _ in range(2):
+        cocktails = asyncio.run(service.generate_cocktails_batch(requests_batch))
+        assert cocktails == [{**COCKTAIL, 'image_prompt': cocktails[0]['image_prompt']}] * 12
+
+def test_request_failures_become_none(service, monkeypatch):
+    def flaky_api(messages):
+        if 'échec' in messages[-1]['content']:
+            raise requests.exceptions.ConnectionError('connexion perdue')
+        return api_response(messages)
+    monkeypatch.setattr(service, '_make_api_request', flaky_api)
+    
+    cocktails = asyncio.run(service.generate_cocktails_batch(['un succès', 'un échec']))
+    
+    assert cocktails[0]['name'] == COCKTAIL['name']
+    assert cocktails[1] is None
+
+def test_programming_errors_propagate(service, monkeypatch):
+    def broken_api(messages):
+        raise RuntimeError('bug')
+    monkeypatch.setattr(service, '_make_api_request', broken_api)
+    
+    with pytest.raises(RuntimeError, match='bug'):
+        asyncio.run(service.generate_cocktails_batch(['un cocktail']))
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests du test de connexion (sonde de santé) à l'API Mistral
+"""
+
+def test_health_probe_is_never_retried(service):
+    probe_adapter = service._session.get_adapter(service.models_url)
+    api_adapter = service._session.get_adapter(service.base_url)
+    
+    assert probe_adapter.max_retries.total == 0
+    assert api_adapter.max_retries.total == service.max_retries
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests du cache exact des réponses Mistral (LLMCache)
+"""
+
+import pytest
+
+from services import llm_cache
+from services.llm_cache import LLMCache
+
+COCKTAIL = {'name': 'Mojito', 'ingredients': ['5 cl rhum', '2 cl citron vert']}
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge monotone contrôlée par le test."""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_cache_key_ignores_dict_order():
+    messages = [{'role': 'user', 'content': 'Un cocktail frais'}]
+    reordered = [{'content': 'Un cocktail frais', 'role': 'user'}]
+    
+    assert LLMCache.cache_key('m', messages, 0.8, 0.9) == LLMCache.cache_key('m', reordered, 0.8, 0.9)
+    assert LLMCache.cache_key('m', messages, 0.8, 0.9) != LLMCache.cache_key('m', messages, 0.7, 0.9)
+
+def test_get_returns_independent_copy():
+    cache = LLMCache()
+    cache.set('key', COCKTAIL)
+    
+    cached = cache.get('key')
+    cached['ingredients'].append('glace')
+    
+    assert cached == {**COCKTAIL, 'ingredients': COCKTAIL['ingredients'] + ['glace']}
+    assert cache.get('key') == COCKTAIL
+
+def test_entry_expires_after_ttl(clock):
+    cache = LLMCache(ttl=10)
+    cache.set('key', COCKTAIL)
+    
+    clock[0] += 10
+    assert cache.get('key') == COCKTAIL
+    
+    clock[0] += 0.5
+    assert cache.get('key') is None
+    assert cache.get_stats() == {'hits': 1, 'misses': 1, 'size': 0}
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = LLMCache(maxsize=2)
+    cache.set('a', {'name': 'a'})
+    cache.set('b', {'name': 'b'})
+    
+    # Lire 'a' la rend plus récente que 'b', qui est évincée à l'insertion suivante
+    assert cache.get('a') == {'name': 'a'}
+    cache.set('c', {'name': 'c'})
+    
+    assert cache.get('b') is None
+    assert cache.get('a') == {'name': 'a'}
+    assert cache.get('c') == {'name': 'c'}
+    assert cache.get_stats()['size'] == 2
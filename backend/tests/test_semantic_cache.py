@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests du cache sémantique des réponses Mistral (SemanticCache)
+"""
+
+from services.llm_cache import SemanticCache
+
+def test_near_duplicate_request_is_a_hit():
+    cache = SemanticCache(threshold=0.9)
+    cache.add([1.0, 0.0, 0.0], {'name': 'Mojito'})
+    
+    # Similarité cosinus ~0.995 : même demande, formulée autrement
+    assert cache.search([10.0, 1.0, 0.0]) == {'name': 'Mojito'}
+    # Vecteur orthogonal : demande différente
+    assert cache.search([0.0, 1.0, 0.0]) is None
+    assert cache.get_stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+def test_search_on_empty_cache_is_a_miss():
+    cache = SemanticCache()
+    
+    assert cache.search([1.0, 0.0]) is None
+    assert cache.get_stats()['misses'] == 1
+
+def test_eviction_keeps_vectors_and_values_aligned():
+    cache = SemanticCache(threshold=0.99, maxsize=2)
+    axes = ([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])
+    for index, axis in enumerate(axes):
+        cache.add(axis, {'name': f'cocktail {index}'})
+    
+    # La plus ancienne entrée est évincée des deux structures à la fois
+    assert cache.get_stats()['size'] == 2
+    assert len(cache._vectors) == 2
+    assert cache.search(axes[0]) is None
+    assert cache.search(axes[1]) == {'name': 'cocktail 1'}
+    assert cache.search(axes[2]) == {'name': 'cocktail 2'}
+
+def test_search_returns_independent_copy():
+    cache = SemanticCache()
+    cache.add([1.0, 0.0], {'name': 'Mojito', 'ingredients': ['rhum']})
+    
+    cache.search([1.0, 0.0])['ingredients'].append('glace')
+    
+    assert cache.search([1.0, 0.0]) == {'name': 'Mojito', 'ingredients': ['rhum']}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests de la génération de cocktail en streaming, champ par champ
+"""
+
+import orjson
+import requests
+
+from services.mistral_service import _STREAMED_FIELD_RE
+
+COCKTAIL = {
+    'name': 'Le "Graoully" fumé',
+    'image_prompt': 'Un verre ambré sur fond noir',
+    'ingredients': ['4 cl whisky [tourbé]', '2 cl sirop d\'érable'],
+    'description': 'Un clin d\'œil au dragon de Metz.',
+    'music_ambiance': 'Blues acoustique'
+}
+
+def fragments(text, size=7):
+    """Découpe une réponse en fragments, comme les tokens d'un flux SSE."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def streamed_fields(content):
+    return {match.group('field'): orjson.loads(match.group('value'))
+            for match in _STREAMED_FIELD_RE.finditer(content)}
+
+def test_field_is_extracted_only_once_complete():
+    assert streamed_fields('{"name": "Le \\"Graou') == {}
+    assert streamed_fields('{"name": "Le \\"Graoully\\" fumé", "ingr') == {'name': 'Le "Graoully" fumé'}
+
+def test_list_field_is_extracted_only_once_closed():
+    partial = '{"ingredients": ["4 cl whisky [tourbé]", "2 cl'
+    
+    assert streamed_fields(partial) == {}
+    assert streamed_fields(partial + ' sirop"]') == {'ingredients': ['4 cl whisky [tourbé]', '2 cl sirop']}
+
+def test_unknown_fields_are_ignored():
+    assert streamed_fields('{"glass": "tumbler", "name": "Nuit messine"}') == {'name': 'Nuit messine'}
+
+def test_stream_cocktail_yields_each_field_then_the_validated_cocktail(service, monkeypatch):
+    content = orjson.dumps(COCKTAIL).decode()
+    monkeypatch.setattr(service, '_stream_completion', lambda messages: iter(fragments(content)))
+    
+    events = list(service.stream_cocktail('Un whisky fumé'))
+    
+    assert events[:-1] == list(COCKTAIL.items())
+    assert events[-1] == ('cocktail', COCKTAIL)
+
+def test_stream_cocktail_reports_invalid_sheet(service, monkeypatch):
+    content = orjson.dumps({'name': 'Incomplet'}).decode()
+    monkeypatch.setattr(service, '_stream_completion', lambda messages: iter(fragments(content)))
+    
+    assert list(service.stream_cocktail('Un cocktail')) == [('name', 'Incomplet'), ('cocktail', None)]
+
+def test_stream_cocktail_reports_connection_error(service, monkeypatch):
+    def failing_stream(messages):
+        yield '{"name": "Coupé"'
+        raise requests.exceptions.ConnectionError('connexion perdue')
+    monkeypatch.setattr(service, '_stream_completion', failing_stream)
+    
+    assert list(service.stream_cocktail('Un cocktail')) == [('name', 'Coupé'), ('cocktail', None)]